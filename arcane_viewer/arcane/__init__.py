@@ -4,24 +4,52 @@ __email__ = "jplesueur@phrozen.io"
 __copyright__ = "Copyright 2024, Phrozen"
 __license__ = "Apache License 2.0"
 
+from .chunk_cache import ChunkCache
 from .client import Client
 from .constants import (APP_DISPLAY_NAME, APP_ICON, APP_NAME,
                         APP_ORGANIZATION_NAME, APP_VERSION, DEFAULT_JSON,
-                        SETTINGS_KEY_BLOCK_SIZE, SETTINGS_KEY_CLIPBOARD_MODE,
-                        SETTINGS_KEY_IMAGE_QUALITY, SETTINGS_KEY_PACKET_SIZE,
-                        SETTINGS_KEY_TRUSTED_CERTIFICATES,
+                        EVENTS_DROP_WARNING_INTERVAL, EVENTS_MAX_WRITE_SIZE,
+                        EVENTS_OUTBOUND_QUEUE_SIZE, NET_CONNECT_ATTEMPT_DELAY,
+                        NET_CONNECT_TIMEOUT, NET_KEEPALIVE_COUNT,
+                        NET_KEEPALIVE_IDLE, NET_KEEPALIVE_INTERVAL,
+                        NET_RESOLVER_CACHE_TTL, SETTINGS_KEY_BLOCK_SIZE,
+                        SETTINGS_KEY_CHUNK_CACHE_SIZE,
+                        SETTINGS_KEY_CLIPBOARD_MODE,
+                        SETTINGS_KEY_DECODE_DOWNSCALE,
+                        SETTINGS_KEY_DIRECT_BLIT, SETTINGS_KEY_ENGINE_PROCESS,
+                        SETTINGS_KEY_IMAGE_QUALITY,
+                        SETTINGS_KEY_MOUSE_MOVE_RATE, SETTINGS_KEY_PACKET_SIZE,
+                        SETTINGS_KEY_PIPELINE_BUDGET,
+                        SETTINGS_KEY_PIPELINE_OVERFLOW,
+                        SETTINGS_KEY_TRANSPORT_PROFILE,
+                        SETTINGS_KEY_TRUSTED_CERTIFICATES, VD_CHUNK_CACHE_SIZE,
+                        VD_DECODE_MAX_IN_FLIGHT, VD_DECODE_MAX_WORKERS,
+                        VD_DOWNSCALE_STEPS, VD_ENGINE_NOTIFY_INTERVAL,
+                        VD_ENGINE_REGION_LOCKS, VD_ENGINE_STOP_TIMEOUT,
+                        VD_FRAMEBUFFER_FORMAT, VD_FRAMEBUFFER_TILE_SIZE,
+                        VD_PIPELINE_BUDGET, VD_RESYNC_DELAY,
                         VD_WINDOW_ADJUST_RATIO)
 from .exceptions import ArcaneProtocolError, ArcaneProtocolException
-from .protocol import (PROTOCOL_VERSION, ArcaneProtocolCommand, BlockSize,
-                       ClipboardMode, InputEvent, MouseButton, MouseCursorKind,
-                       MouseState, OutputEvent, PacketSize, WorkerKind)
+from .image_pool import ImagePool
+from .metrics import ConnectionTiming, StreamMetrics
+from .network import (HostResolver, TransportProfile, connect_first,
+                      default_transport_profile, effective_options,
+                      host_resolver, load_transport_profiles)
+from .pipeline import ChunkQueue, PipelineBudget
+from .protocol import (DIRTY_RECT_HEADER, PROTOCOL_VERSION,
+                       ArcaneProtocolCommand, BlockSize, ClipboardMode,
+                       InputEvent, MouseButton, MouseCursorKind, MouseState,
+                       OutputEvent, OverflowPolicy, PacketSize, WorkerKind)
 from .screen import Screen
-from .session import Session
+from .session import DetachedSession, Session
+from .shared_framebuffer import SharedFramebuffer
+from .tls_session import TLSSessionCache, create_ssl_context
 
 __all__ = [
     'ArcaneProtocolError',
     'ArcaneProtocolException',
     'PROTOCOL_VERSION',
+    'DIRTY_RECT_HEADER',
     'BlockSize',
     'ClipboardMode',
     'InputEvent',
@@ -29,17 +57,55 @@ __all__ = [
     'MouseCursorKind',
     'MouseState',
     'OutputEvent',
+    'OverflowPolicy',
     'PacketSize',
     'ArcaneProtocolCommand',
     'WorkerKind',
     'Client',
     'Screen',
     'Session',
+    'DetachedSession',
+    'TLSSessionCache',
+    'create_ssl_context',
+    'SharedFramebuffer',
+    'StreamMetrics',
+    'ConnectionTiming',
+    'HostResolver',
+    'host_resolver',
+    'connect_first',
+    'TransportProfile',
+    'default_transport_profile',
+    'load_transport_profiles',
+    'effective_options',
+    'PipelineBudget',
+    'ChunkQueue',
+    'ChunkCache',
+    'ImagePool',
     'APP_ICON',
     'APP_NAME',
     'APP_ORGANIZATION_NAME',
     'APP_DISPLAY_NAME',
     'VD_WINDOW_ADJUST_RATIO',
+    'VD_DECODE_MAX_WORKERS',
+    'VD_DECODE_MAX_IN_FLIGHT',
+    'VD_FRAMEBUFFER_TILE_SIZE',
+    'VD_FRAMEBUFFER_FORMAT',
+    'VD_DOWNSCALE_STEPS',
+    'VD_RESYNC_DELAY',
+    'VD_ENGINE_REGION_LOCKS',
+    'VD_ENGINE_NOTIFY_INTERVAL',
+    'VD_ENGINE_STOP_TIMEOUT',
+    'VD_PIPELINE_BUDGET',
+    'VD_CHUNK_CACHE_SIZE',
+    'EVENTS_OUTBOUND_QUEUE_SIZE',
+    'EVENTS_MAX_WRITE_SIZE',
+    'EVENTS_DROP_WARNING_INTERVAL',
+    'NET_CONNECT_TIMEOUT',
+    'NET_CONNECT_ATTEMPT_DELAY',
+    'NET_RESOLVER_CACHE_TTL',
+    'NET_KEEPALIVE_IDLE',
+    'NET_KEEPALIVE_INTERVAL',
+    'NET_KEEPALIVE_COUNT',
     'APP_VERSION',
     'DEFAULT_JSON',
     'SETTINGS_KEY_TRUSTED_CERTIFICATES',
@@ -47,4 +113,12 @@ __all__ = [
     'SETTINGS_KEY_PACKET_SIZE',
     'SETTINGS_KEY_BLOCK_SIZE',
     'SETTINGS_KEY_CLIPBOARD_MODE',
+    'SETTINGS_KEY_MOUSE_MOVE_RATE',
+    'SETTINGS_KEY_DECODE_DOWNSCALE',
+    'SETTINGS_KEY_DIRECT_BLIT',
+    'SETTINGS_KEY_ENGINE_PROCESS',
+    'SETTINGS_KEY_PIPELINE_BUDGET',
+    'SETTINGS_KEY_PIPELINE_OVERFLOW',
+    'SETTINGS_KEY_CHUNK_CACHE_SIZE',
+    'SETTINGS_KEY_TRANSPORT_PROFILE',
 ]
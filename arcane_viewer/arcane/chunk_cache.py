@@ -0,0 +1,113 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Set, Union
+
+from PyQt6.QtGui import QImage
+
+
+class ChunkCache:
+    """ Least recently used cache of decoded chunks, keyed by a hash of their compressed bytes. Remote desktops keep
+    sending identical chunks (blinking caret, spinners, clock...), those are then decoded only once.
+
+    Things to note:
+        * Cached images are shared with every consumer, they must never be modified (chunks are only ever drawn from).
+        * Memory used by cached images is bounded by `capacity` (bytes), least recently used chunks are evicted first.
+        * The cache is thread-safe, it is used by every decoder worker.
+        * Chunks no longer cached (evicted or replaced) are returned by `put`, so their memory can be reused (E.g. given
+        back to an image pool).
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._chunks: OrderedDict[Hashable, QImage] = OrderedDict()
+
+        # `QImage.cacheKey` of cached images, shared with their shallow copies (see `holds`)
+        self._image_keys: Set[int] = set()
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(data: memoryview, *variant: Hashable) -> Hashable:
+        """ Cache key of an encoded chunk, `variant` distinguishes different decodings of the same data (E.g. scale) """
+        return hashlib.blake2b(data, digest_size=16).digest(), len(data), variant
+
+    def get(self, key: Hashable) -> Optional[QImage]:
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                self.misses += 1
+
+                return None
+
+            self._chunks.move_to_end(key)
+
+            self.hits += 1
+
+        return chunk
+
+    def put(self, key: Hashable, chunk: QImage) -> List[QImage]:
+        """ Cache a decoded chunk, return chunks dropped from the cache to make room for it """
+        size = chunk.sizeInBytes()
+        if size > self.capacity:
+            return []
+
+        dropped_chunks = []
+
+        with self._lock:
+            previous_chunk = self._chunks.pop(key, None)
+            if previous_chunk is not None:
+                self.bytes -= previous_chunk.sizeInBytes()
+                self._image_keys.discard(previous_chunk.cacheKey())
+                dropped_chunks.append(previous_chunk)
+
+            self._chunks[key] = chunk
+            self._image_keys.add(chunk.cacheKey())
+            self.bytes += size
+
+            while self.bytes > self.capacity:
+                _, evicted_chunk = self._chunks.popitem(last=False)
+
+                self.bytes -= evicted_chunk.sizeInBytes()
+                self._image_keys.discard(evicted_chunk.cacheKey())
+                self.evictions += 1
+
+                dropped_chunks.append(evicted_chunk)
+
+        return dropped_chunks
+
+    def holds(self, image: QImage) -> bool:
+        """ Whether the given image (or a shallow copy of it, E.g. a chunk taken from the cache) is cached """
+        with self._lock:
+            return image.cacheKey() in self._image_keys
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chunks.clear()
+            self._image_keys.clear()
+
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """ Cache counters (totals since the cache was created) """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "chunk_cache_hits": self.hits,
+                "chunk_cache_misses": self.misses,
+                "chunk_cache_hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "chunk_cache_evictions": self.evictions,
+                "chunk_cache_entries": len(self._chunks),
+                "chunk_cache_bytes": self.bytes,
+            }
@@ -22,12 +22,20 @@ import hashlib
 import json
 import logging
 import socket
-import ssl
+from typing import Optional
 
 import arcane_viewer.arcane as arcane
 
+from .metrics import ConnectionTiming
+from .network import (TransportProfile, connect_first, effective_options,
+                      host_resolver)
+from .tls_session import TLSSessionCache, create_ssl_context
+
 logger = logging.getLogger(__name__)
 
+# Maximum amount of bytes requested from the TLS socket at once when filling the receive buffer
+RECV_BUFFER_SIZE = 65536
+
 
 class Client:
     """ Client class to handle secure communication with remote server
@@ -35,32 +43,75 @@ class Client:
         * It is possible to read and write to a socket at the same time, so one thread (for example the main thread) can
         write to the socket while a secondary thread reads from it (at the same time).
     """
-    def __init__(self, server_address: str, server_port: int, password: str) -> None:
+    def __init__(self, server_address: str, server_port: int, password: str,
+                 tls_session_cache: Optional[TLSSessionCache] = None,
+                 timing: Optional[ConnectionTiming] = None,
+                 transport_profile: Optional[TransportProfile] = None) -> None:
         self.id = -1
 
+        # Bytes already received from the socket but not yet consumed by any of the read methods, lines, JSON
+        # objects and binary payloads are all served from this buffer so they can share the same large socket reads.
+        self._recv_buffer = bytearray()
+
+        # Duration of each connection phase, the caller can keep timing further phases (E.g. session attach)
+        self.timing = timing if timing is not None else ConnectionTiming("Connection")
+
         self.info("Connecting to remote server: `{}:{}`...".format(
             server_address,
             server_port
         ))
 
-        self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        with self.timing.phase("DNS"):
+            addresses = host_resolver.resolve(server_address, server_port)
+
+        self.debug("Establishing connection to remote server...")
+
+        # Resolved addresses (IPv4 / IPv6) are raced, first one to accept the connection is used
+        with self.timing.phase("TCP connect"):
+            self.client = connect_first(
+                addresses,
+                arcane.NET_CONNECT_TIMEOUT,
+                arcane.NET_CONNECT_ATTEMPT_DELAY / 1000,
+                transport_profile,
+            )
+
+        self.debug(f"Connected to `{self.client.getpeername()[0]}`")
 
-        self.debug("Creating and configure new SSL context...")
-        self.context = ssl.create_default_context()
-        self.context.check_hostname = False
-        self.context.verify_mode = ssl.CERT_NONE
+        # When a TLS session cache is given (connections of the same session), its context is shared and the previous
+        # TLS session is offered to the server for resumption
+        if tls_session_cache is not None:
+            self.context = tls_session_cache.context
+        else:
+            self.debug("Creating and configure new SSL context...")
+            self.context = create_ssl_context()
 
+        # Handshake is explicitly done (instead of on wrap) so it is timed separately
         self.conn = self.context.wrap_socket(
             self.client,
             server_hostname=server_address,
+            do_handshake_on_connect=False,
+            session=tls_session_cache.session if tls_session_cache is not None else None,
         )
 
         self.id = self.conn.fileno()
 
-        self.debug("Establishing connection to remote server...")
-        self.conn.settimeout(10)
+        # Effective values, the system may adjust or cap requested ones
+        if transport_profile is not None:
+            self.info("Transport options: {}".format(
+                ", ".join(f"{name}={value}" for name, value in effective_options(self.conn).items())
+            ))
+
+        self.conn.settimeout(arcane.NET_CONNECT_TIMEOUT)
+
+        with self.timing.phase("TLS handshake"):
+            self.conn.do_handshake()
 
-        self.conn.connect((server_address, server_port))
+        # Whether the connection resumed a previous TLS session (abbreviated handshake)
+        self.session_reused = bool(self.conn.session_reused)
+        if tls_session_cache is not None:
+            tls_session_cache.add_handshake(self.session_reused)
+
+        self.info("TLS session resumed" if self.session_reused else "Full TLS handshake")
 
         server_certificate = self.conn.getpeercert(binary_form=True)
         if server_certificate is None:
@@ -75,12 +126,19 @@ class Client:
 
         self.info("Connected! Authenticating with remote server...")
 
-        self.authenticate(password)
+        with self.timing.phase("Authentication"):
+            self.authenticate(password)
 
         self.info("Authentication successful")
 
+        # Session tickets (TLS 1.3) were received along with the authentication exchange
+        if tls_session_cache is not None:
+            tls_session_cache.update(self.conn)
+
     def __del__(self) -> None:
-        self.close()
+        # Nothing to close if the connection could not be established
+        if hasattr(self, "conn"):
+            self.close()
 
     def _log(self, level, message: str) -> None:
         """ Log a message with the client ID as prefix
@@ -96,24 +154,79 @@ class Client:
     def info(self, message: str) -> None:
         self._log(logging.INFO, message)
 
-    def read_line(self) -> str:
-        data = b""
+    def _fill_buffer(self) -> bool:
+        """ Read as much as available from the socket (up to `RECV_BUFFER_SIZE`) and append it to the receive buffer,
+        return False if the connection was closed by the remote peer """
+        data = self.conn.recv(RECV_BUFFER_SIZE)
+        if not data:
+            return False
+
+        self._recv_buffer += data
 
+        return True
+
+    def read_line(self) -> str:
+        offset = 0
         while True:
+            index = self._recv_buffer.find(b'\n', offset)
+            if index != -1:
+                data = bytes(self._recv_buffer[:index + 1])
+                del self._recv_buffer[:index + 1]
+
+                break
+
+            # Next search will only cover freshly received bytes
+            offset = len(self._recv_buffer)
+
             try:
-                b = self.conn.recv(1)
+                filled = self._fill_buffer()
             except (Exception, ):
-                break
+                filled = False
 
-            if not b:
-                break
+            if not filled:
+                data = bytes(self._recv_buffer)
+                self._recv_buffer.clear()
 
-            data += b
-            if b == b'\n':
                 break
 
         return data.decode('utf-8').strip()
 
+    def read_into(self, view: memoryview) -> int:
+        """ Read up to the size of the given writable buffer, received bytes are directly written into it avoiding any
+        intermediate allocation. Pending bytes from the receive buffer are served first, otherwise we wait for the
+        socket. Returns the number of bytes written, zero means the connection was closed """
+        if self._recv_buffer:
+            size = min(len(view), len(self._recv_buffer))
+            view[:size] = self._recv_buffer[:size]
+            del self._recv_buffer[:size]
+
+            return size
+
+        return self.conn.recv_into(view)
+
+    def read_exact_into(self, view: memoryview) -> None:
+        """ Fill the whole given buffer, TLS reads can return fewer bytes than requested so we loop until the buffer is
+        complete. Raise `ConnectionError` if the connection is closed before """
+        size = len(view)
+        bytes_read = 0
+        while bytes_read < size:
+            b = self.read_into(view[bytes_read:])
+            if not b:
+                raise ConnectionError(f"Connection closed after {bytes_read} of {size} expected bytes")
+
+            bytes_read += b
+
+    def read_exact(self, size: int) -> bytes:
+        """ Read exactly `size` bytes, see `read_exact_into` """
+        data = bytearray(size)
+        self.read_exact_into(memoryview(data))
+
+        return bytes(data)
+
+    def write(self, data: bytes) -> None:
+        """ Write raw bytes (E.g. several already encoded lines at once), unlike `write_line` errors are raised """
+        self.conn.sendall(data)
+
     def write_line(self, line: str) -> None:
         try:
             self.conn.write(line.encode('utf-8') + b'\r\n')
@@ -7,6 +7,8 @@
 import os
 import sys
 
+from PyQt6.QtGui import QImage
+
 ASSETS_IDENTIFIER = "arcane_viewer.assets"
 
 # Asset path getter
@@ -32,6 +34,30 @@ APP_DISPLAY_NAME = f"{APP_NAME} {APP_VERSION}"
 
 # Remote Desktop Engine Hardcoded Values
 VD_WINDOW_ADJUST_RATIO = 90
+VD_DECODE_MAX_WORKERS = 4
+VD_DECODE_MAX_IN_FLIGHT = 64
+VD_FRAMEBUFFER_TILE_SIZE = 256
+VD_FRAMEBUFFER_FORMAT = QImage.Format.Format_RGB32  # Chunks are decoded straight to this format
+VD_DOWNSCALE_STEPS = 8  # Decode-time scale is rounded up to the next 1/x
+VD_RESYNC_DELAY = 500  # ms
+VD_ENGINE_REGION_LOCKS = 16
+VD_ENGINE_NOTIFY_INTERVAL = 4  # ms
+VD_ENGINE_STOP_TIMEOUT = 5  # seconds
+VD_PIPELINE_BUDGET = 128  # MiB (default)
+VD_CHUNK_CACHE_SIZE = 32  # MiB (default)
+
+# Events Engine Hardcoded Values
+EVENTS_OUTBOUND_QUEUE_SIZE = 1024  # Above this depth, mouse moves are dropped (other events are always queued)
+EVENTS_DROP_WARNING_INTERVAL = 5  # seconds
+EVENTS_MAX_WRITE_SIZE = 16384
+
+# Network Hardcoded Values
+NET_CONNECT_TIMEOUT = 10  # seconds
+NET_CONNECT_ATTEMPT_DELAY = 250  # ms, before racing the next resolved address (Happy Eyeballs)
+NET_RESOLVER_CACHE_TTL = 30  # seconds
+NET_KEEPALIVE_IDLE = 30  # seconds (default)
+NET_KEEPALIVE_INTERVAL = 10  # seconds (default)
+NET_KEEPALIVE_COUNT = 3  # (default)
 
 # Assets absolute paths
 DEFAULT_JSON = os.path.join(get_asset_file("default.json"))
@@ -43,3 +69,11 @@ SETTINGS_KEY_IMAGE_QUALITY = "image_quality"
 SETTINGS_KEY_PACKET_SIZE = "packet_size"
 SETTINGS_KEY_BLOCK_SIZE = "block_size"
 SETTINGS_KEY_CLIPBOARD_MODE = "clipboard_mode"
+SETTINGS_KEY_MOUSE_MOVE_RATE = "mouse_move_rate"
+SETTINGS_KEY_DECODE_DOWNSCALE = "decode_downscale"
+SETTINGS_KEY_DIRECT_BLIT = "direct_blit"
+SETTINGS_KEY_ENGINE_PROCESS = "engine_process"
+SETTINGS_KEY_PIPELINE_BUDGET = "pipeline_budget"
+SETTINGS_KEY_PIPELINE_OVERFLOW = "pipeline_overflow"
+SETTINGS_KEY_CHUNK_CACHE_SIZE = "chunk_cache_size"
+SETTINGS_KEY_TRANSPORT_PROFILE = "transport_profile"  # Suffixed with the worker kind (E.g. `transport_profile.Events`)
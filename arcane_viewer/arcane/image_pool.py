@@ -0,0 +1,100 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+from PyQt6.QtCore import QSize
+from PyQt6.QtGui import QImage
+
+from .chunk_cache import ChunkCache
+from .constants import VD_FRAMEBUFFER_FORMAT
+
+
+class ImagePool:
+    """ Pool of decoded chunk images, chunks are decoded into images given back by the paint stage instead of new ones.
+
+    Things to note:
+        * Images are grouped in size classes (one per chunk size), chunks are cut by the server along the configured
+        block size so only a few classes exist: full blocks, and partial blocks along the right and bottom edges.
+        Chunks bigger than a block are not pooled.
+        * Images still held by the decoded chunk `cache` are not pooled, decoding into them would allocate a new
+        buffer anyway (Qt implicit sharing) and their memory would be counted twice. They are given back once evicted
+        from the cache.
+        * The pool keeps shallow copies of given back images. If an image is used again somewhere else after being
+        given back, decoding into its pooled copy transparently allocates a new buffer, a pooled image can therefore
+        never be overwritten while in use.
+    """
+    def __init__(self, block_size: int, images_per_class: int,
+                 image_format: QImage.Format = VD_FRAMEBUFFER_FORMAT, cache: Optional[ChunkCache] = None) -> None:
+        self.block_size = block_size
+        self.images_per_class = images_per_class
+        self.image_format = image_format
+        self.cache = cache
+
+        self._lock = threading.Lock()
+        self._classes: Dict[Tuple[int, int], List[QImage]] = {}
+
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.detached = 0
+
+    def acquire(self, size: QSize) -> QImage:
+        """ Get an image of the given size, from the pool if possible """
+        with self._lock:
+            images = self._classes.get((size.width(), size.height()))
+            if images:
+                image = images.pop()
+
+                self.bytes -= image.sizeInBytes()
+                self.hits += 1
+
+                return image
+
+            self.misses += 1
+
+        return QImage(size, self.image_format)
+
+    def release(self, image: QImage) -> None:
+        """ Give an image back to the pool, ignored if it is still cached (see class notes) """
+        if (
+                image.isNull() or
+                (self.cache is not None and self.cache.holds(image)) or
+                image.format() != self.image_format or
+                image.width() > self.block_size or
+                image.height() > self.block_size
+        ):
+            return
+
+        with self._lock:
+            images = self._classes.setdefault((image.width(), image.height()), [])
+            if len(images) >= self.images_per_class:
+                return
+
+            images.append(QImage(image))
+
+            self.bytes += image.sizeInBytes()
+
+    def add_detached(self) -> None:
+        """ A pooled image was still in use, decoding into it allocated a new buffer """
+        with self._lock:
+            self.detached += 1
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """ Pool counters (totals since the pool was created) """
+        with self._lock:
+            reused = self.hits - self.detached
+            acquired = self.hits + self.misses
+
+            return {
+                "image_pool_reused": reused,
+                "image_pool_allocated": self.misses + self.detached,
+                "image_pool_reuse_ratio": round(reused / acquired, 3) if acquired else 0.0,
+                "image_pool_classes": len(self._classes),
+                "image_pool_images": sum(len(images) for images in self._classes.values()),
+                "image_pool_bytes": self.bytes,
+            }
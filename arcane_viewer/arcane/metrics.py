@@ -0,0 +1,164 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional, Union
+
+
+def _percentile(samples: Deque[float], percentile: float) -> float:
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class StreamMetrics:
+    """ Counters shared by the virtual desktop stages (socket, decode and paint), they are updated from different
+    threads and periodically turned into rates and timings by `snapshot`.
+
+    Things to note:
+        * Counting is always active (it is cheap), only the snapshot / display is toggled at runtime.
+        * Timing samples are kept in bounded deques, so nothing grows if snapshots are never requested.
+    """
+    def __init__(self, max_samples: int = 4096) -> None:
+        self._lock = threading.Lock()
+
+        self.chunks_received = 0
+        self.bytes_received = 0
+        self.chunks_decoded = 0
+        self.chunks_superseded = 0
+        self.format_mismatches = 0
+        self.chunks_composited = 0
+        self.flushes = 0
+
+        self.decode_times: Deque[float] = deque(maxlen=max_samples)
+        self.composite_times: Deque[float] = deque(maxlen=max_samples)
+
+        self._snapshot_time = time.monotonic()
+
+    def add_received(self, size: int) -> None:
+        with self._lock:
+            self.chunks_received += 1
+            self.bytes_received += size
+
+    def add_decoded(self, duration: float) -> None:
+        with self._lock:
+            self.chunks_decoded += 1
+            self.decode_times.append(duration)
+
+    def add_format_mismatch(self) -> None:
+        """ A chunk was not decoded in the framebuffer format and had to be converted (by the decoder) """
+        with self._lock:
+            self.format_mismatches += 1
+
+    def add_superseded(self) -> None:
+        """ A chunk was dropped because a newer chunk covers it entirely """
+        with self._lock:
+            self.chunks_superseded += 1
+
+    def add_composited(self, duration: float, chunks: int) -> None:
+        with self._lock:
+            self.flushes += 1
+            self.chunks_composited += chunks
+            self.composite_times.append(duration)
+
+    def add_blitted(self, duration: float) -> None:
+        """ A chunk was drawn into the backing store outside of a scene refresh (direct blitting) """
+        with self._lock:
+            self.chunks_composited += 1
+            self.composite_times.append(duration)
+
+    def add_flush(self) -> None:
+        with self._lock:
+            self.flushes += 1
+
+    def snapshot(self) -> Dict[str, Union[int, float]]:
+        """ Return rates (per second) and timings (milliseconds) since the previous snapshot, then reset counters """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(now - self._snapshot_time, 1e-6)
+
+            decode_times = self.decode_times.copy()
+            composite_times = self.composite_times.copy()
+
+            snapshot: Dict[str, Union[int, float]] = {
+                "chunks_received_per_sec": round(self.chunks_received / elapsed, 1),
+                "bytes_received_per_sec": round(self.bytes_received / elapsed),
+                "chunks_decoded_per_sec": round(self.chunks_decoded / elapsed, 1),
+                "chunks_superseded_per_sec": round(self.chunks_superseded / elapsed, 1),
+                "format_mismatches_per_sec": round(self.format_mismatches / elapsed, 1),
+                "flushes_per_sec": round(self.flushes / elapsed, 1),
+                "chunks_composited_per_sec": round(self.chunks_composited / elapsed, 1),
+            }
+
+            self.chunks_received = 0
+            self.bytes_received = 0
+            self.chunks_decoded = 0
+            self.chunks_superseded = 0
+            self.format_mismatches = 0
+            self.chunks_composited = 0
+            self.flushes = 0
+            self.decode_times.clear()
+            self.composite_times.clear()
+
+            self._snapshot_time = now
+
+        snapshot["decode_avg_ms"] = round(sum(decode_times) * 1000 / len(decode_times), 2) if decode_times else 0.0
+        snapshot["decode_p95_ms"] = round(_percentile(decode_times, 0.95) * 1000, 2)
+        snapshot["composite_avg_ms"] = round(
+            sum(composite_times) * 1000 / len(composite_times), 2
+        ) if composite_times else 0.0
+        snapshot["composite_p95_ms"] = round(_percentile(composite_times, 0.95) * 1000, 2)
+
+        return snapshot
+
+
+class ConnectionTiming:
+    """ Duration of each phase of a connection to the server (E.g. DNS, TCP connect, TLS handshake, authentication),
+    measured with a monotonic clock and kept in the order phases happened.
+
+    `on_phase` is called (from the connecting thread) with the connection name, the phase name and its duration in
+    seconds each time a phase completes.
+    """
+    def __init__(self, name: str, on_phase: Optional[Callable[[str, str, float], None]] = None) -> None:
+        self.name = name
+        self.on_phase = on_phase
+
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """ Time the enclosed block as the given phase (only recorded if the block succeeds) """
+        start = time.monotonic()
+
+        yield
+
+        duration = time.monotonic() - start
+
+        self.phases[name] = duration
+
+        if self.on_phase is not None:
+            self.on_phase(self.name, name, duration)
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def as_dict(self) -> Dict[str, float]:
+        """ Phase durations in milliseconds """
+        return {name: round(duration * 1000, 2) for name, duration in self.phases.items()}
+
+    def __str__(self) -> str:
+        return "{}: {} (total {:.1f} ms)".format(
+            self.name,
+            ", ".join(f"{name} {duration * 1000:.1f} ms" for name, duration in self.phases.items()),
+            self.total * 1000,
+        )
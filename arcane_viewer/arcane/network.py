@@ -0,0 +1,289 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+
+    Description:
+        Server address resolution (with a short-lived cache) and Happy Eyeballs style connection (RFC 8305): every
+        resolved address (IPv4 and IPv6) is tried, attempts are started one after another with a short delay without
+        waiting for the previous ones to fail, the first connection established wins.
+
+        Connections are tuned (Nagle, socket buffers, keepalive) according to the transport profile of their channel
+        (worker kind).
+"""
+
+import copy
+import logging
+import queue
+import socket
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PyQt6.QtCore import QSettings
+
+from .constants import (NET_KEEPALIVE_COUNT, NET_KEEPALIVE_IDLE,
+                        NET_KEEPALIVE_INTERVAL, NET_RESOLVER_CACHE_TTL,
+                        SETTINGS_KEY_TRANSPORT_PROFILE)
+from .protocol import WorkerKind
+
+logger = logging.getLogger(__name__)
+
+# (Address family, socket address) as returned by `getaddrinfo`
+Address = Tuple[int, Tuple[Any, ...]]
+
+
+class HostResolver:
+    """ Resolve server addresses, results are cached for `ttl` seconds so connections of the same session (session
+    request then workers attached concurrently) only trigger a single lookup """
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[Address]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[Address]:
+        """ Resolve the given host to its IPv4 and IPv6 addresses, in connection order. Raise `socket.gaierror` if the
+        host cannot be resolved """
+        key = (host, port)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+
+        addresses = interleave_families([
+            (family, socket_address)
+            for family, _, _, _, socket_address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        ])
+
+        logger.debug(f"`{host}` resolved to: {', '.join(str(address[1][0]) for address in addresses)}")
+
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, addresses)
+
+        return addresses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+def interleave_families(addresses: List[Address]) -> List[Address]:
+    """ Remove duplicates and alternate address families, starting with the family of the first (preferred) address,
+    so a broken IPv6 (or IPv4) path only delays the connection by one attempt """
+    families: Dict[int, List[Address]] = {}
+    for address in addresses:
+        family_addresses = families.setdefault(address[0], [])
+        if address not in family_addresses:
+            family_addresses.append(address)
+
+    interleaved = []
+    while any(families.values()):
+        for family_addresses in families.values():
+            if family_addresses:
+                interleaved.append(family_addresses.pop(0))
+
+    return interleaved
+
+
+# Shared by every connection to the server
+host_resolver = HostResolver(NET_RESOLVER_CACHE_TTL)
+
+
+class TransportProfile:
+    """ Socket options of a channel (worker connection), applied before connecting so buffer sizes are taken into
+    account for the TCP window negotiation.
+
+    Things to note:
+        * Buffer sizes are in bytes, 0 keeps the system default. The system may adjust (E.g. Linux doubles) or cap
+        the requested size, see `effective_options` for the values actually in use.
+        * Keepalive timings are in seconds, keepalive is disabled when `keepalive_idle` is 0.
+    """
+    def __init__(self, no_delay: bool = False, receive_buffer_size: int = 0, send_buffer_size: int = 0,
+                 keepalive_idle: int = 0, keepalive_interval: int = NET_KEEPALIVE_INTERVAL,
+                 keepalive_count: int = NET_KEEPALIVE_COUNT) -> None:
+        self.no_delay = no_delay
+        self.receive_buffer_size = receive_buffer_size
+        self.send_buffer_size = send_buffer_size
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+    def as_dict(self) -> Dict[str, Union[bool, int]]:
+        return dict(self.__dict__)
+
+    def updated(self, values: Dict[str, Any]) -> "TransportProfile":
+        """ Copy of the profile with the given (possibly partial) stored values applied, unknown ones are ignored """
+        profile = copy.copy(self)
+        for name, value in values.items():
+            if name not in profile.__dict__:
+                continue
+
+            # Depending on the settings backend, booleans can be read back as strings
+            if isinstance(profile.__dict__[name], bool) and isinstance(value, str):
+                value = value.lower() == "true"
+
+            setattr(profile, name, type(profile.__dict__[name])(value))
+
+        return profile
+
+    def apply(self, sock: socket.socket) -> None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.no_delay))
+
+        if self.receive_buffer_size > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size)
+
+        if self.send_buffer_size > 0:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(self.keepalive_idle > 0))
+        if self.keepalive_idle <= 0:
+            return
+
+        # Keepalive timings are set differently depending on the platform
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_idle)
+        elif hasattr(socket, "TCP_KEEPALIVE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, self.keepalive_idle)
+        elif hasattr(socket, "SIO_KEEPALIVE_VALS"):
+            sock.ioctl(  # type: ignore[attr-defined]
+                socket.SIO_KEEPALIVE_VALS,  # type: ignore[attr-defined]
+                (1, self.keepalive_idle * 1000, self.keepalive_interval * 1000)
+            )
+
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.keepalive_interval)
+
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, self.keepalive_count)
+
+
+def effective_options(sock: socket.socket) -> Dict[str, Union[bool, int]]:
+    """ Socket options actually in use (as reported by the system) """
+    options: Dict[str, Union[bool, int]] = {
+        "no_delay": bool(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)),
+        "receive_buffer_size": sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        "send_buffer_size": sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+        "keepalive": bool(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)),
+    }
+
+    if options["keepalive"]:
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options["keepalive_idle"] = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE)
+
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            options["keepalive_interval"] = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL)
+
+        if hasattr(socket, "TCP_KEEPCNT"):
+            options["keepalive_count"] = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT)
+
+    return options
+
+
+def default_transport_profile(worker_kind: WorkerKind) -> TransportProfile:
+    """ Desktop channel is a bulk inbound stream, its receive buffer size is left to the system (autotuning grows it
+    with the connection throughput, a fixed size disables it) unless configured. Events channel carries small latency
+    sensitive messages (E.g. mouse moves, key strokes) which must not be held back by Nagle's algorithm. Both are
+    long-lived connections that can stay idle, keepalive detects a dead peer """
+    if worker_kind == WorkerKind.Desktop:
+        return TransportProfile(keepalive_idle=NET_KEEPALIVE_IDLE)
+
+    return TransportProfile(no_delay=True, keepalive_idle=NET_KEEPALIVE_IDLE)
+
+
+def load_transport_profiles(settings: QSettings) -> Dict[WorkerKind, TransportProfile]:
+    """ Transport profile of each channel, defaults overridden by the stored settings """
+    return {
+        worker_kind: default_transport_profile(worker_kind).updated(
+            settings.value(f"{SETTINGS_KEY_TRANSPORT_PROFILE}.{worker_kind.name}", {})
+        )
+        for worker_kind in WorkerKind
+    }
+
+
+def connect_first(addresses: List[Address], timeout: float, attempt_delay: float,
+                  profile: Optional[TransportProfile] = None) -> socket.socket:
+    """ Connect to the first reachable address. A new attempt is started every `attempt_delay` seconds (or as soon as
+    the previous one failed) while previous ones are still pending, the first established connection is returned and
+    other attempts are closed. Raise `TimeoutError` if no connection is established within `timeout` seconds, or the
+    error of the last attempt if all of them failed. The transport profile (if any) is applied to every attempt """
+    deadline = time.monotonic() + timeout
+
+    results: queue.Queue[Tuple[Optional[socket.socket], Optional[OSError]]] = queue.Queue()
+
+    # Once a winner is chosen, late connections are closed by their attempt (see `attempt`)
+    done = False
+    done_lock = threading.Lock()
+
+    def attempt(address: Address) -> None:
+        result: Tuple[Optional[socket.socket], Optional[OSError]]
+
+        sock = socket.socket(address[0], socket.SOCK_STREAM)
+        try:
+            if profile is not None:
+                profile.apply(sock)
+
+            sock.settimeout(max(0.0, deadline - time.monotonic()))
+
+            sock.connect(address[1])
+
+            result = (sock, None)
+        except OSError as e:
+            sock.close()
+
+            result = (None, e)
+
+        with done_lock:
+            if done:
+                if result[0] is not None:
+                    result[0].close()
+            else:
+                results.put(result)
+
+    pending = list(addresses)
+    running = 0
+    error: Optional[OSError] = None
+    try:
+        while pending or running:
+            if pending:
+                address = pending.pop(0)
+
+                logger.debug(f"Connection attempt to `{address[1][0]}`...")
+
+                threading.Thread(target=attempt, args=(address, ), name="ArcaneConnect", daemon=True).start()
+
+                running += 1
+
+            # Wait for the current attempts until it is time to start the next one
+            wait_until = min(time.monotonic() + attempt_delay, deadline) if pending else deadline
+
+            try:
+                sock, error = results.get(timeout=max(0.0, wait_until - time.monotonic()))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Could not connect within {timeout} seconds")
+
+                continue
+
+            running -= 1
+
+            if sock is not None:
+                sock.settimeout(None)
+
+                return sock
+
+            # Attempt failed, next address (if any) is tried right away
+    finally:
+        with done_lock:
+            done = True
+
+            while not results.empty():
+                sock, _ = results.get()
+                if sock is not None:
+                    sock.close()
+
+    if error is not None:
+        raise error
+
+    raise OSError("No address to connect to")
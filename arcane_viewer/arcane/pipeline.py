@@ -0,0 +1,152 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+from PyQt6.QtGui import QImage
+
+from .image_pool import ImagePool
+from .protocol import OverflowPolicy
+
+
+class PipelineBudget:
+    """ Memory accounting shared by the virtual desktop stages (socket, decode and paint). Each stage holds the bytes of
+    the chunks it owns: compressed while received / decoded, then decoded while waiting to be painted.
+
+    Things to note:
+        * Only the socket stage waits for memory (`reserve`): when the budget is exhausted, the socket is no longer read
+        and the remote server is slowed down by TCP flow control (backpressure).
+        * Other stages never wait (`hold`), the budget can therefore be slightly exceeded while chunks are converted
+        from compressed to decoded.
+        * A single chunk bigger than the whole budget is still accepted when nothing else is held.
+    """
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self.held = 0
+        self.peak = 0
+        self.waits = 0
+
+    def reserve(self, size: int) -> None:
+        """ Wait until `size` bytes fit in the budget then hold them """
+        with self._condition:
+            if self.held > 0 and self.held + size > self.budget:
+                self.waits += 1
+
+            while not self._closed and self.held > 0 and self.held + size > self.budget:
+                self._condition.wait()
+
+            self._hold(size)
+
+    def hold(self, size: int) -> None:
+        """ Hold `size` bytes without waiting """
+        with self._condition:
+            self._hold(size)
+
+    def _hold(self, size: int) -> None:
+        self.held += size
+        self.peak = max(self.peak, self.held)
+
+    def release(self, size: int) -> None:
+        if size <= 0:
+            return
+
+        with self._condition:
+            self.held = max(0, self.held - size)
+
+            self._condition.notify_all()
+
+    def is_full(self, size: int = 0) -> bool:
+        return self.held + size > self.budget
+
+    def close(self) -> None:
+        """ Stop waiting for memory (E.g. pipeline is being stopped) """
+        with self._condition:
+            self._closed = True
+
+            self._condition.notify_all()
+
+
+class ChunkQueue:
+    """ Decoded chunks waiting for the paint stage (GUI thread), bytes of queued chunks are held in the pipeline budget
+    until they are taken.
+
+    When the budget is exhausted and the overflow policy is `DropSuperseded`, queued chunks entirely replaced by a newer
+    chunk (same position and size) are dropped, since they would be painted over anyway.
+    """
+    def __init__(self, budget: PipelineBudget, overflow_policy: OverflowPolicy,
+                 pool: Optional[ImagePool] = None) -> None:
+        self.budget = budget
+        self.overflow_policy = overflow_policy
+
+        # Dropped chunks are given back to the pool they were decoded into (if any)
+        self.pool = pool
+
+        self._lock = threading.Lock()
+        self._chunks: List[Tuple[QImage, int, int, float]] = []
+
+        self.bytes = 0
+        self.dropped = 0
+
+    def put(self, chunk: QImage, x: int, y: int, scale: float) -> bool:
+        """ Queue a decoded chunk, return True if the queue was empty (the paint stage must be notified) """
+        size = chunk.sizeInBytes()
+        dropped_bytes = 0
+        dropped_chunks = []
+
+        with self._lock:
+            if self.overflow_policy == OverflowPolicy.DropSuperseded and self.budget.is_full(size):
+                kept_chunks = []
+                for queued_chunk in self._chunks:
+                    queued_image, queued_x, queued_y, queued_scale = queued_chunk
+                    if (
+                            queued_x == x and
+                            queued_y == y and
+                            queued_scale == scale and
+                            queued_image.size() == chunk.size()
+                    ):
+                        dropped_bytes += queued_image.sizeInBytes()
+                        dropped_chunks.append(queued_image)
+                        self.dropped += 1
+                    else:
+                        kept_chunks.append(queued_chunk)
+
+                self._chunks = kept_chunks
+
+            notify = not self._chunks
+
+            self._chunks.append((chunk, x, y, scale))
+            self.bytes += size - dropped_bytes
+
+        self.budget.hold(size)
+        self.budget.release(dropped_bytes)
+
+        if self.pool is not None:
+            for dropped_chunk in dropped_chunks:
+                self.pool.release(dropped_chunk)
+
+        return notify
+
+    def take(self) -> List[Tuple[QImage, int, int, float]]:
+        """ Take every queued chunk (in order) """
+        with self._lock:
+            chunks = self._chunks
+            size = self.bytes
+
+            self._chunks = []
+            self.bytes = 0
+
+        self.budget.release(size)
+
+        return chunks
+
+    @property
+    def depth(self) -> int:
+        return len(self._chunks)
@@ -4,10 +4,14 @@
     More information about the LICENSE on the LICENSE file in the root directory of the project.
 """
 
+import struct
 from enum import Enum, auto
 
 PROTOCOL_VERSION = '5.0.2'
 
+# Virtual desktop dirty rect header: chunk size, x, y, screen updated flag (13 bytes)
+DIRTY_RECT_HEADER = struct.Struct('IIIB')
+
 
 class WorkerKind(Enum):
     Desktop = 0x1
@@ -104,3 +108,15 @@ class BlockSize(Enum):
     @property
     def display_name(self) -> str:
         return f"{self.value}x{self.value}"
+
+
+class OverflowPolicy(Enum):
+    Block = 0x1
+    DropSuperseded = 0x2
+
+    @property
+    def display_name(self) -> str:
+        return {
+            OverflowPolicy.Block: "Block (Slow down stream)",
+            OverflowPolicy.DropSuperseded: "Drop superseded blocks",
+        }[self]
@@ -6,28 +6,155 @@
 
 import json
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 
 from PyQt6.QtCore import QSettings
 
 import arcane_viewer.arcane as arcane
 
+from .metrics import ConnectionTiming
+from .network import TransportProfile, load_transport_profiles
+from .tls_session import TLSSessionCache
+
 logger = logging.getLogger(__name__)
 
 
+def claim_client(server_address: str, server_port: int, password: str, session_id: Optional[str],
+                 server_fingerprint: Optional[str], worker_kind: Optional[arcane.WorkerKind] = None,
+                 tls_session_cache: Optional[TLSSessionCache] = None,
+                 on_phase: Optional[Callable[[str, str, float], None]] = None,
+                 transport_profiles: Optional[Dict[arcane.WorkerKind, TransportProfile]] = None) -> arcane.Client:
+    """ Establish a new TLS connection to the remote server and authenticate. Optionally we can specify a worker
+    to be attached to an existing session, and a TLS session cache to resume the TLS session of previous connections.
+    Connection phases are timed (`client.timing`), `on_phase` is called as each of them completes. Worker connections
+    are tuned according to their channel transport profile """
+    timing = ConnectionTiming(worker_kind.name if worker_kind is not None else "Session", on_phase)
+
+    transport_profile = None
+    if worker_kind is not None and transport_profiles is not None:
+        transport_profile = transport_profiles.get(worker_kind)
+
+    client = arcane.Client(server_address, server_port, password, tls_session_cache, timing, transport_profile)
+
+    # If a session is already established and a worker kind is provided, we attach to current session a new worker
+    if worker_kind is not None:
+        if session_id is None:
+            raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.MissingSession)
+
+        # If the server fingerprint has changed after session creation, we may be facing a MITM attack,
+        # Abort connection
+        if server_fingerprint != client.server_fingerprint:
+            raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.ServerFingerprintTampered)
+
+        with timing.phase("Session attach"):
+            client.write_line("AttachToSession")
+
+            client.write_line(session_id)
+
+            response = client.read_line()
+            if response != "ResourceFound":
+                raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.ResourceNotFound)
+
+            client.write_line(worker_kind.name)
+
+        client.info(f"Connection timing, {timing}")
+
+    return client
+
+
+def create_chunk_cache(size: int) -> Optional[arcane.ChunkCache]:
+    """ Create the decoded chunk cache of the given size (MiB), None if disabled """
+    return arcane.ChunkCache(size * 1024 * 1024) if size > 0 else None
+
+
+class DetachedSession:
+    """ Picklable subset of an established session, used to attach workers from another process (E.g. the desktop
+    engine process) """
+    def __init__(self, server_address: str, server_port: int, password: str, session_id: Optional[str],
+                 server_fingerprint: Optional[str], option_image_quality: int, option_packet_size: arcane.PacketSize,
+                 option_block_size: arcane.BlockSize, option_pipeline_overflow: arcane.OverflowPolicy,
+                 option_chunk_cache_size: int,
+                 transport_profiles: Dict[arcane.WorkerKind, TransportProfile]) -> None:
+        self.server_address = server_address
+        self.server_port = server_port
+        self.__password = password
+
+        self.session_id = session_id
+        self.server_fingerprint = server_fingerprint
+
+        self.option_image_quality = option_image_quality
+        self.option_packet_size = option_packet_size
+        self.option_block_size = option_block_size
+        self.option_pipeline_overflow = option_pipeline_overflow
+        self.option_chunk_cache_size = option_chunk_cache_size
+
+        self.transport_profiles = transport_profiles
+
+        # Metrics, decoded chunk cache and TLS sessions of the process the session is used in
+        self.metrics = arcane.StreamMetrics()
+        self.chunk_cache = create_chunk_cache(option_chunk_cache_size)
+        self.tls_session_cache = TLSSessionCache()
+
+    def __getstate__(self) -> dict:
+        # Metrics and caches hold a lock which cannot be pickled, new instances are created in the target process
+        state = self.__dict__.copy()
+        del state["metrics"]
+        del state["chunk_cache"]
+        del state["tls_session_cache"]
+
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+        self.metrics = arcane.StreamMetrics()
+        self.chunk_cache = create_chunk_cache(self.option_chunk_cache_size)
+        self.tls_session_cache = TLSSessionCache()
+
+    def claim_client(self, worker_kind: Optional[arcane.WorkerKind] = None) -> arcane.Client:
+        return claim_client(
+            self.server_address,
+            self.server_port,
+            self.__password,
+            self.session_id,
+            self.server_fingerprint,
+            worker_kind,
+            self.tls_session_cache,
+            transport_profiles=self.transport_profiles,
+        )
+
+
 class Session:
-    """ Session class to handle remote session """
-    def __init__(self, server_address: str, server_port: int, password: str) -> None:
+    """ Session class to handle remote session
+
+    `on_connection_phase` is called (from the connecting thread) with the connection name, phase name and duration
+    (seconds) as each phase of the session request connection completes (E.g. to report connection progress) """
+    def __init__(self, server_address: str, server_port: int, password: str,
+                 on_connection_phase: Optional[Callable[[str, str, float], None]] = None) -> None:
         self.server_address = server_address
         self.server_port = server_port
         self.__password = password
 
+        self.on_connection_phase = on_connection_phase
+
+        # Phase timings of every connection established by the session (session request, then workers)
+        self.connection_timings: List[ConnectionTiming] = []
+
         self.presentation = False
 
         self.session_id: Optional[str] = None
         self.display_name: Optional[str] = None
         self.server_fingerprint: Optional[str] = None
 
+        # Worker connections being attached in background (see `preattach_workers`)
+        self._preattached_clients: Dict[arcane.WorkerKind, Future] = {}
+        self._preattached_clients_lock = threading.Lock()
+
+        # Virtual desktop streaming metrics (Updated by the desktop thread, its decoder and the desktop window)
+        self.metrics = arcane.StreamMetrics()
+
         # Load settings (options)
         settings = QSettings(arcane.APP_ORGANIZATION_NAME, arcane.APP_NAME)
 
@@ -39,44 +166,139 @@ class Session:
         self.option_packet_size = settings.value(arcane.SETTINGS_KEY_PACKET_SIZE, arcane.PacketSize.Size4096)
         self.option_block_size = settings.value(arcane.SETTINGS_KEY_BLOCK_SIZE, arcane.BlockSize.Size64)
 
+        # Input Options (Maximum mouse move events sent per second, 0 means unlimited)
+        self.option_mouse_move_rate = settings.value(arcane.SETTINGS_KEY_MOUSE_MOVE_RATE, 120, type=int)
+
+        # Rendering Options (Decode chunks at display resolution when the window is smaller than the remote screen)
+        self.option_decode_downscale = settings.value(arcane.SETTINGS_KEY_DECODE_DOWNSCALE, False, type=bool)
+
+        # Chunks are drawn into the virtual desktop by the decoder instead of the GUI thread
+        self.option_direct_blit = settings.value(arcane.SETTINGS_KEY_DIRECT_BLIT, False, type=bool)
+
+        # Receive and decode the remote desktop in a separate process (shared memory framebuffer)
+        self.option_engine_process = settings.value(arcane.SETTINGS_KEY_ENGINE_PROCESS, False, type=bool)
+
+        # Memory budget (MiB) of chunks between the socket, decode and paint stages, and what to do once it is exhausted
+        self.option_pipeline_budget = settings.value(
+            arcane.SETTINGS_KEY_PIPELINE_BUDGET, arcane.VD_PIPELINE_BUDGET, type=int
+        )
+        self.option_pipeline_overflow = settings.value(
+            arcane.SETTINGS_KEY_PIPELINE_OVERFLOW, arcane.OverflowPolicy.Block
+        )
+
+        # Decoded chunks are cached (MiB, 0 means disabled), the cache is kept as long as the session lives
+        self.option_chunk_cache_size = settings.value(
+            arcane.SETTINGS_KEY_CHUNK_CACHE_SIZE, arcane.VD_CHUNK_CACHE_SIZE, type=int
+        )
+        self.chunk_cache = create_chunk_cache(self.option_chunk_cache_size)
+
+        # Socket options of each channel (Nagle, buffer sizes, keepalive)
+        self.transport_profiles = load_transport_profiles(settings)
+
+        # Connections of the session (session request, workers) resume the same TLS session
+        self.tls_session_cache = TLSSessionCache()
+
         self.request_session()
 
     def claim_client(self, worker_kind: Optional[arcane.WorkerKind] = None) -> arcane.Client:
         """ Establish a new TLS connection to the remote server and authenticate. Optionally we can specify a worker
-        to be attached to the current session """
-        client = arcane.Client(self.server_address, self.server_port, self.__password)
-
-        # If a session is already established and a worker kind is provided, we attach to current session a new worker
+        to be attached to the current session, a worker connection already attached in background is used if any """
         if worker_kind is not None:
-            if self.session_id is None:
-                raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.MissingSession)
+            with self._preattached_clients_lock:
+                preattached_client = self._preattached_clients.pop(worker_kind, None)
+
+            if preattached_client is not None:
+                try:
+                    return preattached_client.result()
+                except Exception as e:
+                    logger.warning(f"Could not attach `{worker_kind.name}` worker in background: `{e}`, retrying...")
+
+        return self._claim_client(worker_kind)
+
+    def _claim_client(self, worker_kind: Optional[arcane.WorkerKind] = None,
+                      on_phase: Optional[Callable[[str, str, float], None]] = None) -> arcane.Client:
+        client = claim_client(
+            self.server_address,
+            self.server_port,
+            self.__password,
+            self.session_id,
+            self.server_fingerprint,
+            worker_kind,
+            self.tls_session_cache,
+            on_phase,
+            self.transport_profiles,
+        )
+
+        self.connection_timings.append(client.timing)
 
-            # If the server fingerprint has changed after session creation, we may be facing a MITM attack,
-            # Abort connection
-            if self.server_fingerprint != client.server_fingerprint:
-                raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.ServerFingerprintTampered)
+        return client
 
-            client.write_line("AttachToSession")
+    def preattach_workers(self) -> None:
+        """ Attach worker connections (TLS, authentication and `AttachToSession`) concurrently in background as soon as
+        the session is established, workers then get an already attached connection when they start (see
+        `claim_client`) instead of connecting one after another """
+        worker_kinds: List[arcane.WorkerKind] = []
 
-            client.write_line(self.session_id)
+        # Desktop engine process attaches its own desktop worker
+        if not self.option_engine_process:
+            worker_kinds.append(arcane.WorkerKind.Desktop)
 
-            response = client.read_line()
-            if response != "ResourceFound":
-                raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.ResourceNotFound)
+        # No events worker in presentation mode (the server will not create it either)
+        if not self.presentation:
+            worker_kinds.append(arcane.WorkerKind.Events)
 
-            client.write_line(worker_kind.name)
+        if not worker_kinds:
+            return
 
-        return client
+        executor = ThreadPoolExecutor(max_workers=len(worker_kinds), thread_name_prefix="ArcaneAttach")
+        try:
+            with self._preattached_clients_lock:
+                for worker_kind in worker_kinds:
+                    self._preattached_clients[worker_kind] = executor.submit(self._claim_client, worker_kind)
+        finally:
+            executor.shutdown(wait=False)
+
+    def release_preattached_workers(self) -> None:
+        """ Close worker connections attached in background but never claimed """
+        with self._preattached_clients_lock:
+            preattached_clients = list(self._preattached_clients.values())
+
+            self._preattached_clients.clear()
+
+        for preattached_client in preattached_clients:
+            preattached_client.add_done_callback(
+                lambda future: future.result().close() if future.exception() is None else None
+            )
+
+    def detach(self) -> DetachedSession:
+        """ Return a picklable copy of the session, able to attach workers from another process """
+        return DetachedSession(
+            self.server_address,
+            self.server_port,
+            self.__password,
+            self.session_id,
+            self.server_fingerprint,
+            self.option_image_quality,
+            self.option_packet_size,
+            self.option_block_size,
+            self.option_pipeline_overflow,
+            self.option_chunk_cache_size,
+            self.transport_profiles,
+        )
 
     def request_session(self) -> None:
         """ Request a new session to the remote server """
-        client = self.claim_client()
+        client = self._claim_client(on_phase=self.on_connection_phase)
         try:
             self.server_fingerprint = client.server_fingerprint
 
-            client.write_line("RequestSession")
+            with client.timing.phase("Session request"):
+                client.write_line("RequestSession")
+
+                session_information = client.read_json()
+
+            client.info(f"Connection timing, {client.timing}")
 
-            session_information = client.read_json()
             if session_information is None:
                 raise arcane.ArcaneProtocolException(arcane.ArcaneProtocolError.InvalidStructureData)
 
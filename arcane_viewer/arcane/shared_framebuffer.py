@@ -0,0 +1,119 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+from multiprocessing import shared_memory
+from typing import Any, List, Optional
+
+from PyQt6 import sip
+from PyQt6.QtCore import QPoint, QRect, QSize, Qt
+from PyQt6.QtGui import QImage, QPainter
+
+import arcane_viewer.arcane as arcane
+
+
+class SharedFramebuffer:
+    """ Remote desktop framebuffer (32-bit `VD_FRAMEBUFFER_FORMAT`) living in shared memory, it is written by the engine
+    process and painted by the GUI process without any copy between both.
+
+    Things to note:
+        * The framebuffer is split in horizontal bands, each band being protected by its own (inter-process) lock
+        taken from `region_locks`. Locks are always acquired in ascending order by both processes.
+        * The shared memory block is created with a fixed size, when the remote screen size changes a new framebuffer
+        is created (with a new name) and the previous one is released.
+        * The `QImage` directly wraps the shared memory, it must be released before the shared memory is closed (see
+        `close`).
+    """
+    def __init__(self, size: QSize, region_locks: List[Any], name: Optional[str] = None) -> None:
+        self.size = QSize(size)
+        self.region_locks = region_locks
+
+        bytes_per_line = size.width() * 4
+
+        self.owner = name is None
+        if self.owner:
+            self.shared_memory = shared_memory.SharedMemory(create=True, size=max(1, bytes_per_line * size.height()))
+        else:
+            self.shared_memory = shared_memory.SharedMemory(name=name)
+
+        # Passing the buffer itself would make PyQt copy it, we want the image to use the shared memory in place
+        address = int(sip.voidptr(self.shared_memory.buf))  # type: ignore[arg-type]
+
+        self.image: Optional[QImage] = QImage(  # type: ignore[call-overload]
+            sip.voidptr(address),
+            size.width(),
+            size.height(),
+            bytes_per_line,
+            arcane.VD_FRAMEBUFFER_FORMAT
+        )
+
+        if self.owner:
+            self.image.fill(Qt.GlobalColor.black)
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def rect(self) -> QRect:
+        return QRect(QPoint(0, 0), self.size)
+
+    @property
+    def band_height(self) -> int:
+        return max(1, -(-self.size.height() // len(self.region_locks)))
+
+    def region_indexes(self, rect: QRect) -> range:
+        """ Indexes of the region locks (bands) covering the given rect """
+        rect = rect.intersected(self.rect())
+        if rect.isEmpty():
+            return range(0)
+
+        return range(rect.top() // self.band_height, rect.bottom() // self.band_height + 1)
+
+    def blit(self, chunk: QImage, x: int, y: int) -> QRect:
+        """ Draw a chunk into the framebuffer (engine process), return its dirty rect """
+        dirty_rect = QRect(x, y, chunk.width(), chunk.height())
+
+        if self.image is None:
+            return dirty_rect
+
+        indexes = self.region_indexes(dirty_rect)
+        for index in indexes:
+            self.region_locks[index].acquire()
+        try:
+            painter = QPainter(self.image)
+            try:
+                painter.drawImage(QPoint(x, y), chunk)
+            finally:
+                painter.end()
+        finally:
+            for index in indexes:
+                self.region_locks[index].release()
+
+        return dirty_rect
+
+    def draw(self, painter: QPainter, rect: QRect) -> None:
+        """ Paint the given part of the framebuffer (GUI process), each band is locked while being read """
+        if self.image is None:
+            return
+
+        for index in self.region_indexes(rect):
+            band_rect = rect.intersected(
+                QRect(0, index * self.band_height, self.size.width(), self.band_height)
+            )
+
+            with self.region_locks[index]:
+                painter.drawImage(band_rect, self.image, band_rect)
+
+    def close(self) -> None:
+        """ Release the framebuffer, the shared memory is destroyed by its owner (engine process) """
+        self.image = None
+
+        self.shared_memory.close()
+
+        if self.owner:
+            try:
+                self.shared_memory.unlink()
+            except FileNotFoundError:
+                pass
@@ -5,11 +5,16 @@ __copyright__ = "Copyright 2024, Phrozen"
 __license__ = "Apache License 2.0"
 
 from .connect import ConnectThread
+from .decoder import DirtyRectDecoder, scale_rect
+from .engine import EngineDesktopThread
 from .events import EventsThread
 from .v_desktop import VirtualDesktopThread
 
 __all__ = [
     'ConnectThread',
+    'DirtyRectDecoder',
+    'EngineDesktopThread',
     'EventsThread',
     'VirtualDesktopThread',
+    'scale_rect',
 ]
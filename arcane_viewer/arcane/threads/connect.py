@@ -5,6 +5,7 @@
 """
 
 import logging
+import socket
 
 from PyQt6.QtCore import QThread, pyqtSignal
 
@@ -20,6 +21,9 @@ class ConnectThread(QThread):
     thread_finished = pyqtSignal(object)
     session_error = pyqtSignal(str)
 
+    # Connection name, phase name and its duration (seconds), emitted as each phase of the session request completes
+    connection_phase = pyqtSignal(str, str, float)
+
     def __init__(self, server_address: str, server_port: int, password: str) -> None:
         super().__init__()
 
@@ -36,7 +40,11 @@ class ConnectThread(QThread):
                 self.server_address,
                 self.server_port,
                 self.__password,
+                self.connection_phase.emit,
             )
+
+            # Session id is known, worker connections are attached while the virtual desktop window is being set up
+            session.preattach_workers()
         except Exception as e:
             logger.error(f"An error occurred while connecting to the server: {e}")
 
@@ -47,6 +55,8 @@ class ConnectThread(QThread):
                     e.reason == arcane.ArcaneProtocolError.UnsupportedVersion):
                 error_message = ("Protocol version mismatch, be sure to connect to a compatible server"
                                  f" (v{arcane.PROTOCOL_VERSION})")
+            elif isinstance(e, socket.gaierror):
+                error_message = "Invalid hostname or IP address, the server address could not be resolved"
             elif isinstance(e, TimeoutError):
                 error_message = "The connection to the server timed out, check the server address and port"
             else:
@@ -0,0 +1,367 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from PyQt6.QtCore import QBuffer, QByteArray, QRect, QSize
+from PyQt6.QtGui import QImage, QImageReader
+
+import arcane_viewer.arcane as arcane
+
+logger = logging.getLogger(__name__)
+
+# Position and size of a chunk on the remote screen (x, y, width, height)
+ChunkKey = Tuple[int, int, int, int]
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def scale_rect(rect: QRect, scale: float) -> QRect:
+    """ Map a remote screen rect to a backing store of the given scale. Edges are rounded down so that adjacent rects
+    remain adjacent once scaled (no gap nor overlap between neighbour chunks) """
+    if scale == 1.0:
+        return QRect(rect)
+
+    left = math.floor(rect.x() * scale)
+    top = math.floor(rect.y() * scale)
+    right = math.floor((rect.x() + rect.width()) * scale)
+    bottom = math.floor((rect.y() + rect.height()) * scale)
+
+    return QRect(left, top, max(1, right - left), max(1, bottom - top))
+
+
+def read_chunk_size(data: memoryview) -> QSize:
+    """ Read the size of an encoded chunk (JPEG or PNG) straight from its header bytes, without copying nor decoding
+    it (invalid size if unknown) """
+    if data[:8] == PNG_SIGNATURE:
+        if len(data) < 24:
+            return QSize()
+
+        # IHDR is always the first chunk: width and height follow its length and type
+        width, height = struct.unpack_from(">II", data, 16)
+
+        return QSize(width, height)
+
+    if data[:2] != b"\xff\xd8":
+        return QSize()
+
+    # Walk JPEG segments (after SOI) until the start of frame one
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return QSize()
+
+        marker = data[offset + 1]
+
+        # Fill bytes
+        if marker == 0xFF:
+            offset += 1
+
+            continue
+
+        # Segments without payload
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            offset += 2
+
+            continue
+
+        # Start of frame (except DHT, JPG and DAC which share the range)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if offset + 9 > len(data):
+                return QSize()
+
+            height, width = struct.unpack_from(">HH", data, offset + 5)
+
+            return QSize(width, height)
+
+        # Start of scan reached without any frame header
+        if marker == 0xDA:
+            return QSize()
+
+        offset += 2 + struct.unpack_from(">H", data, offset + 2)[0]
+
+    return QSize()
+
+
+def image_address(image: QImage) -> int:
+    """ Address of the image pixels (without detaching the image) """
+    bits = image.constBits()
+
+    return int(bits) if bits is not None else 0
+
+
+class DirtyRectDecoder:
+    """ Decode virtual desktop chunks in parallel using a bounded pool of worker threads
+
+    Things to note:
+        * Chunks are received in buffers owned by the decoder (see `acquire_buffer`), a buffer is given back to the pool
+        as soon as its chunk is decoded. When every buffer is in use, `acquire_buffer` blocks the socket thread until a
+        worker is done, which keeps the amount of pending work bounded.
+        * Decoded chunks are dispatched in the exact same order they were received, whatever the order workers are done
+        with them, so that overlapping dirty rects are always painted in the order the server intended.
+        * When `scale` is below 1.0, chunks are directly decoded at that scale (`QImageReader.setScaledSize`, JPEG can
+        skip most of the work in that case) and dispatched along with the scale they were decoded at, since the scale
+        might change while chunks are in flight.
+        * When a pipeline `budget` is given, received chunks are accounted in it: compressed bytes from the moment they
+        are received (`acquire_buffer` waits for memory, which stops reading the socket) until they are decoded, then
+        decoded bytes until `on_decoded` returns.
+        * When a `cache` is given, chunks already decoded before (same compressed bytes, at the same scale) are taken
+        from the cache instead of being decoded again.
+        * Chunks are always dispatched in `image_format` (the virtual desktop backing store format), any conversion
+        happens in the worker so that drawing a chunk is a plain copy.
+        * When an image `pool` is given, chunks are decoded into images given back to the pool by the paint stage (or
+        evicted from the `cache`) instead of newly allocated ones.
+        * When `drop_superseded` is set, a chunk entirely covered by a newer chunk (same position and size) is dropped:
+        it is not decoded at all if no worker picked it yet, otherwise it is decoded but not dispatched. Under load, the
+        virtual desktop then catches up with the latest remote frame instead of replaying stale ones. Painting order is
+        not affected since the newer chunk is painted after every chunk received in between.
+    """
+    def __init__(self, on_decoded: Callable[[QImage, int, int, float], None], max_workers: Optional[int] = None,
+                 max_in_flight: int = arcane.VD_DECODE_MAX_IN_FLIGHT,
+                 metrics: Optional[arcane.StreamMetrics] = None, scale: float = 1.0,
+                 budget: Optional[arcane.PipelineBudget] = None, drop_superseded: bool = False,
+                 cache: Optional[arcane.ChunkCache] = None, pool: Optional[arcane.ImagePool] = None,
+                 image_format: QImage.Format = arcane.VD_FRAMEBUFFER_FORMAT) -> None:
+        if max_workers is None:
+            max_workers = max(1, min(arcane.VD_DECODE_MAX_WORKERS, (os.cpu_count() or 1) - 1))
+
+        self.on_decoded = on_decoded
+        self.metrics = metrics
+        self.budget = budget
+        self.drop_superseded = drop_superseded
+        self.cache = cache
+        self.pool = pool
+        self.image_format = image_format
+
+        # Updated from the GUI thread when the window is resized, it applies to chunks submitted afterward
+        self.scale = scale
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ArcaneDecoder")
+
+        self.capacity = max(max_in_flight, max_workers)
+
+        self._free_buffers: queue.Queue[bytearray] = queue.Queue()
+        for _ in range(self.capacity):
+            self._free_buffers.put(bytearray())
+
+        self._pending: queue.Queue[Optional[Tuple[Future, int, int, float, Optional[ChunkKey]]]] = queue.Queue()
+
+        # Latest submitted chunk for each chunk geometry (when dropping superseded chunks)
+        self._latest: Dict[ChunkKey, Tuple[Future, bytearray, int]] = {}
+        self._latest_lock = threading.Lock()
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="ArcaneDecoderDispatcher", daemon=True)
+        self._dispatcher.start()
+
+        logger.debug(f"Decoder started with {max_workers} worker(s)")
+
+    def acquire_buffer(self, size: int) -> bytearray:
+        """ Get a free buffer of at least `size` bytes, buffers are reused and only grow to fit the largest chunk they
+        have received so far """
+        if self.budget is not None:
+            self.budget.reserve(size)
+
+        buffer = self._free_buffers.get()
+        if len(buffer) < size:
+            buffer = bytearray(size)
+
+        return buffer
+
+    def submit(self, buffer: bytearray, size: int, x: int, y: int) -> None:
+        """ Queue a chunk received in a buffer previously obtained from `acquire_buffer` for decoding """
+        scale = self.scale
+
+        key: Optional[ChunkKey] = None
+        if self.drop_superseded:
+            with memoryview(buffer) as view:
+                chunk_size = read_chunk_size(view[:size])
+
+            if chunk_size.isValid():
+                key = (x, y, chunk_size.width(), chunk_size.height())
+
+        future = self._executor.submit(self._decode, buffer, size, x, y, scale)
+
+        if key is not None:
+            with self._latest_lock:
+                superseded = self._latest.get(key)
+
+                self._latest[key] = (future, buffer, size)
+
+            # Chunk was still waiting for a worker, its buffer will never be given back by `_decode`
+            if superseded is not None and superseded[0].cancel():
+                self.release_buffer(superseded[1], superseded[2])
+
+        self._pending.put((future, x, y, scale, key))
+
+    def release_buffer(self, buffer: bytearray, size: int) -> None:
+        """ Give a buffer (holding a chunk of `size` bytes) back to the pool """
+        self._free_buffers.put(buffer)
+
+        if self.budget is not None:
+            self.budget.release(size)
+
+    @property
+    def in_flight(self) -> int:
+        """ Number of chunks received but not yet decoded """
+        return self.capacity - self._free_buffers.qsize()
+
+    @property
+    def pending(self) -> int:
+        """ Number of chunks waiting to be dispatched (decoded or not) """
+        return self._pending.qsize()
+
+    def _decode(self, buffer: bytearray, size: int, x: int, y: int, scale: float) -> QImage:
+        try:
+            with memoryview(buffer) as view:
+                chunk = None
+
+                cache_key = None
+                if self.cache is not None:
+                    # Scaled chunk size depends on where the chunk lands (see `scale_rect`)
+                    cache_key = self.cache.key(view[:size], scale, x, y) if scale < 1.0 else self.cache.key(view[:size])
+
+                    chunk = self.cache.get(cache_key)
+
+                if chunk is None:
+                    start = time.perf_counter()
+
+                    chunk = self._read_chunk(view[:size], x, y, scale)
+
+                    if self.metrics is not None:
+                        self.metrics.add_decoded(time.perf_counter() - start)
+
+                    if self.cache is not None and cache_key is not None and not chunk.isNull():
+                        # Evicted chunks (no longer referenced by the cache) can be decoded into again
+                        for evicted_chunk in self.cache.put(cache_key, chunk):
+                            if self.pool is not None:
+                                self.pool.release(evicted_chunk)
+
+            if self.budget is not None:
+                self.budget.hold(chunk.sizeInBytes())
+
+            return chunk
+        finally:
+            self.release_buffer(buffer, size)
+
+    def _read_chunk(self, data: memoryview, x: int, y: int, scale: float) -> QImage:
+        # Compressed bytes are copied once into the QByteArray, PyQt6 does not expose `QByteArray.fromRawData` which
+        # would let Qt read the receive buffer in place
+        device = QBuffer()
+        device.setData(QByteArray(data))
+
+        reader = QImageReader(device)
+
+        # Image header gives the chunk original size without decoding it
+        size = reader.size()
+        if size.isValid() and scale < 1.0:
+            size = scale_rect(QRect(x, y, size.width(), size.height()), scale).size()
+
+            reader.setScaledSize(size)
+
+        if self.pool is None or not size.isValid():
+            chunk = reader.read()
+            if chunk.isNull():
+                raise ValueError(reader.errorString())
+
+            return self._normalize(chunk)
+
+        # Reader decodes in place when the pooled image has the expected size and format
+        chunk = self.pool.acquire(size)
+        address = image_address(chunk)
+
+        if not reader.read(chunk):
+            raise ValueError(reader.errorString())
+
+        if chunk.format() == self.image_format and image_address(chunk) != address:
+            self.pool.add_detached()
+
+        return self._normalize(chunk)
+
+    def _normalize(self, chunk: QImage) -> QImage:
+        """ Convert the chunk to the backing store format (E.g. grayscale JPEG) """
+        if chunk.format() != self.image_format:
+            if self.metrics is not None:
+                self.metrics.add_format_mismatch()
+
+            chunk.convertTo(self.image_format)
+
+        return chunk
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    break
+
+                future, x, y, scale, key = item
+
+                if key is not None and self._is_superseded(key, future):
+                    if self.metrics is not None:
+                        self.metrics.add_superseded()
+
+                    if not future.cancelled():
+                        self._release_result(future)
+
+                    continue
+
+                try:
+                    chunk = future.result()
+                except Exception as e:
+                    logger.error(f"Could not decode chunk at ({x}, {y}): `{e}`")
+
+                    continue
+
+                try:
+                    self.on_decoded(chunk, x, y, scale)
+                finally:
+                    if self.budget is not None:
+                        self.budget.release(chunk.sizeInBytes())
+            finally:
+                self._pending.task_done()
+
+    def _is_superseded(self, key: ChunkKey, future: Future) -> bool:
+        """ Return True if a newer chunk was submitted for the same geometry, forget the chunk otherwise """
+        with self._latest_lock:
+            latest = self._latest.get(key)
+            if latest is not None and latest[0] is future:
+                del self._latest[key]
+
+                return False
+
+            return True
+
+    def _release_result(self, future: Future) -> None:
+        """ Release the decoded bytes of a chunk which will not be dispatched, its image is given back to the pool """
+        try:
+            chunk = future.result()
+        except Exception:
+            return
+
+        if self.budget is not None:
+            self.budget.release(chunk.sizeInBytes())
+
+        if self.pool is not None:
+            self.pool.release(chunk)
+
+    def flush(self) -> None:
+        """ Wait until every submitted chunk was decoded and dispatched """
+        self._pending.join()
+
+    def close(self) -> None:
+        """ Dispatch remaining chunks then release worker threads """
+        self._pending.put(None)
+        self._dispatcher.join()
+
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,382 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+
+    Description:
+        Optional out-of-process desktop engine. The desktop worker connection, chunk parsing and decoding run in a
+        separate process (with its own interpreter and GIL) which draws into a shared memory framebuffer, the GUI
+        process is only notified of dirty regions through a pipe.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QImage
+
+import arcane_viewer.arcane as arcane
+
+from .decoder import DirtyRectDecoder
+from .v_desktop import (VirtualDesktopThread, desktop_options,
+                        stream_dirty_rects)
+
+logger = logging.getLogger(__name__)
+
+
+class DesktopEngine:
+    """ Desktop worker running in the engine process (see `run_engine`)
+
+    Messages sent to the GUI process (tuples, first item being the message kind):
+        * ("select_screen", [screen, ...]): several screens are available, a ("screen", name) reply is expected, name
+        is None if the selection was canceled.
+        * ("timing", name, phases): phase durations (seconds) of the desktop worker connection, see `ConnectionTiming`.
+        * ("open", screen, shared_memory_name): framebuffer is ready for the (new) selected screen.
+        * ("started", ): streaming started, the events worker can be attached.
+        * ("dirty", [(x, y, width, height), ...]): regions drawn into the framebuffer since previous notification.
+        * ("metrics", snapshot): engine streaming metrics, sent every second.
+        * ("finished", on_error): engine is about to exit.
+
+    Messages received from the GUI process:
+        * ("screen", name): reply to "select_screen".
+        * ("stop", ): stop the engine.
+    """
+    def __init__(self, session: arcane.DetachedSession, connection: Connection, region_locks: List[Any],
+                 preferred_screen_name: Optional[str]) -> None:
+        self.session = session
+        self.connection = connection
+        self.region_locks = region_locks
+        self.preferred_screen_name = preferred_screen_name
+
+        self._running = True
+
+        self.client: Optional[arcane.Client] = None
+        self.framebuffer: Optional[arcane.SharedFramebuffer] = None
+        self.image_pool = arcane.ImagePool(
+            session.option_block_size.value, arcane.VD_DECODE_MAX_IN_FLIGHT, cache=session.chunk_cache
+        )
+
+        self._send_lock = threading.Lock()
+        self._replies: queue.Queue[Optional[Tuple[Any, ...]]] = queue.Queue()
+
+        self.dirty_regions: List[Tuple[int, int, int, int]] = []
+        self._dirty_regions_lock = threading.Lock()
+        self._dirty_regions_event = threading.Event()
+
+        self._listener = threading.Thread(target=self.listen, name="ArcaneEngineListener", daemon=True)
+        self._notifier = threading.Thread(target=self.notify, name="ArcaneEngineNotifier", daemon=True)
+
+    def send(self, *message: Any) -> None:
+        with self._send_lock:
+            self.connection.send(message)
+
+    def listen(self) -> None:
+        """ Receive messages from the GUI process """
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                message = ("stop", )
+
+            if message[0] == "stop":
+                self.stop()
+
+                break
+
+            self._replies.put(message)
+
+    def notify(self) -> None:
+        """ Send dirty regions to the GUI process, regions drawn within a short interval are grouped in a single
+        message """
+        last_metrics = time.monotonic()
+
+        while self._running:
+            self._dirty_regions_event.wait(1)
+            self._dirty_regions_event.clear()
+
+            time.sleep(arcane.VD_ENGINE_NOTIFY_INTERVAL / 1000)
+
+            with self._dirty_regions_lock:
+                dirty_regions = self.dirty_regions
+                self.dirty_regions = []
+
+            try:
+                if dirty_regions:
+                    self.send("dirty", dirty_regions)
+
+                now = time.monotonic()
+                if now - last_metrics >= 1:
+                    metrics = self.session.metrics.snapshot()
+                    if self.session.chunk_cache is not None:
+                        metrics.update(self.session.chunk_cache.stats())
+
+                    metrics.update(self.image_pool.stats())
+
+                    self.send("metrics", metrics)
+
+                    last_metrics = now
+            except OSError:
+                break
+
+    def stop(self) -> None:
+        self._running = False
+
+        self._replies.put(None)
+        self._dirty_regions_event.set()
+
+        if self.client is not None:
+            self.client.close()
+
+    def on_decoded(self, chunk: QImage, x: int, y: int, scale: float) -> None:
+        """ Called (in order) from the decoder dispatcher thread for each decoded chunk """
+        if self.framebuffer is None:
+            return
+
+        start = time.perf_counter()
+
+        dirty_rect = self.framebuffer.blit(chunk, x, y)
+
+        self.session.metrics.add_blitted(time.perf_counter() - start)
+
+        self.image_pool.release(chunk)
+
+        with self._dirty_regions_lock:
+            self.dirty_regions.append((dirty_rect.x(), dirty_rect.y(), dirty_rect.width(), dirty_rect.height()))
+
+        self._dirty_regions_event.set()
+
+    def open_framebuffer(self, screen_information: dict) -> None:
+        """ Create the framebuffer for the (new) selected screen and hand it over to the GUI process """
+        screen = arcane.Screen(screen_information)
+
+        previous_framebuffer = self.framebuffer
+
+        self.framebuffer = arcane.SharedFramebuffer(screen.size(), self.region_locks)
+
+        self.send("open", screen_information, self.framebuffer.name)
+
+        # GUI process keeps its own mapping of the previous framebuffer until it switches to the new one
+        if previous_framebuffer is not None:
+            previous_framebuffer.close()
+
+    def select_screen(self, screens_information: List[dict]) -> Optional[dict]:
+        if len(screens_information) == 1:
+            return screens_information[0]
+
+        for screen_information in screens_information:
+            if screen_information["Name"] == self.preferred_screen_name:
+                return screen_information
+
+        self.send("select_screen", screens_information)
+
+        reply = self._replies.get()
+        if reply is None:
+            return None
+
+        return next((screen_information for screen_information in screens_information
+                     if screen_information["Name"] == reply[1]), None)
+
+    def run(self) -> None:
+        self._listener.start()
+
+        self.client = self.session.claim_client(arcane.WorkerKind.Desktop)
+
+        # Connection timings are gathered by the GUI process session
+        self.send("timing", self.client.timing.name, self.client.timing.phases)
+
+        if not self._running:
+            return
+
+        screens_information = self.client.read_json()["List"]
+        logger.info(f"{len(screens_information)} screen(s) detected")
+
+        screen_information = self.select_screen(screens_information)
+        if screen_information is None:
+            return
+
+        screen = arcane.Screen(screen_information)
+
+        logger.info(f"Screen: {screen.name} ({screen.width}x{screen.height})")
+
+        self.client.write_json(desktop_options(screen.name, self.session))
+
+        self.open_framebuffer(screen_information)
+
+        self.send("started")
+
+        self._notifier.start()
+
+        decoder = DirtyRectDecoder(
+            self.on_decoded,
+            metrics=self.session.metrics,
+            drop_superseded=self.session.option_pipeline_overflow == arcane.OverflowPolicy.DropSuperseded,
+            cache=self.session.chunk_cache,
+            pool=self.image_pool,
+        )
+        try:
+            stream_dirty_rects(
+                self.client,
+                decoder,
+                self.session.metrics,
+                lambda: self._running,
+                self.open_framebuffer,
+            )
+        finally:
+            decoder.close()
+
+    def close(self) -> None:
+        self.stop()
+
+        if self._notifier.is_alive():
+            self._notifier.join()
+
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+            self.framebuffer = None
+
+
+def run_engine(session: arcane.DetachedSession, connection: Connection, region_locks: List[Any],
+               preferred_screen_name: Optional[str], log_level: int) -> None:
+    """ Engine process entry point """
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s - %(name)s[%(process)d:%(thread)d] - %(levelname)s - %(message)s"
+    )
+
+    engine = DesktopEngine(session, connection, region_locks, preferred_screen_name)
+
+    on_error = False
+    try:
+        engine.run()
+
+        logger.debug("Desktop engine gracefully ended.")
+    except Exception as e:
+        if engine._running:
+            logger.error(f"Desktop engine encountered an error: `{e}`")
+            traceback.print_exc()
+            on_error = True
+    finally:
+        engine.close()
+
+        try:
+            engine.send("finished", on_error)
+        except OSError:
+            pass
+
+
+class EngineDesktopThread(VirtualDesktopThread):
+    """ Same role as `VirtualDesktopThread`, except the desktop worker is run by the engine process: this thread starts
+    it, then relays its notifications to the GUI thread. The remote desktop is painted from the shared memory
+    framebuffer named `shared_memory_name`.
+
+    Things to note:
+        * Decode-time downscaling is not supported by the engine, chunks are always decoded at full resolution.
+        * Engine streaming metrics are received every second (`engine_metrics`), the desktop worker connection timing
+        is added to the session `connection_timings` once connected.
+        * Chunks are drawn into the shared framebuffer as soon as they are decoded, there is no paint queue and the
+        pipeline memory budget does not apply (pending work is bounded by the decoder buffers).
+    """
+    def __init__(self, session: arcane.Session, preferred_screen_name: Optional[str] = None,
+                 render_scale: float = 1.0) -> None:
+        super().__init__(session, preferred_screen_name)
+
+        # Spawn (instead of fork) so the engine does not inherit the Qt state of the GUI process
+        context = multiprocessing.get_context("spawn")
+
+        self.region_locks = [context.Lock() for _ in range(arcane.VD_ENGINE_REGION_LOCKS)]
+
+        self.connection, engine_connection = context.Pipe()
+
+        self.process = context.Process(
+            target=run_engine,
+            args=(
+                session.detach(),
+                engine_connection,
+                self.region_locks,
+                preferred_screen_name,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name="ArcaneDesktopEngine",
+            daemon=True,
+        )
+
+        self.shared_memory_name: Optional[str] = None
+        self.engine_metrics: Dict[str, Union[int, float]] = {}
+
+    def run(self) -> None:
+        on_error = False
+        try:
+            self.process.start()
+
+            on_error = self.relay()
+
+            logger.debug(f"`{self.__class__.__name__}` Thread gracefully ended.")
+        except Exception as e:
+            if self._running:
+                logger.error(f"Thread `{self.__class__.__name__}` encountered an error: `{e}`")
+                traceback.print_exc()
+                on_error = True
+        finally:
+            self.stop()
+
+            if self.process.pid is not None:
+                self.process.join(arcane.VD_ENGINE_STOP_TIMEOUT)
+                if self.process.is_alive():
+                    logger.warning("Desktop engine did not stop in time, terminating it...")
+
+                    self.process.terminate()
+                    self.process.join()
+
+            self.thread_finished.emit(on_error)
+
+    def relay(self) -> bool:
+        """ Relay engine messages until it exits, return True if it exited on error """
+        while True:
+            try:
+                message = self.connection.recv()
+            except EOFError:
+                if self._running:
+                    raise ConnectionError("Desktop engine exited unexpectedly")
+
+                return False
+
+            kind = message[0]
+
+            if kind == "dirty":
+                self.add_dirty_regions([QRect(*dirty_region) for dirty_region in message[1]])
+            elif kind == "metrics":
+                self.engine_metrics = message[1]
+            elif kind == "timing":
+                timing = arcane.ConnectionTiming(message[1])
+                timing.phases.update(message[2])
+
+                self.session.connection_timings.append(timing)
+            elif kind == "open":
+                self.selected_screen = arcane.Screen(message[1])
+                self.shared_memory_name = message[2]
+
+                self.open_cellar_door.emit(self.selected_screen)
+            elif kind == "select_screen":
+                self.display_screen_selection_dialog([arcane.Screen(screen) for screen in message[1]])
+
+                selected_screen_name = self.selected_screen.name if self.selected_screen is not None else None
+
+                self.connection.send(("screen", selected_screen_name))
+            elif kind == "started":
+                self.start_events_worker_signal.emit()
+            elif kind == "finished":
+                return bool(message[1])
+
+    def stop(self) -> None:
+        super().stop()
+
+        try:
+            self.connection.send(("stop", ))
+        except (OSError, ValueError):
+            pass
@@ -4,11 +4,16 @@
     More information about the LICENSE on the LICENSE file in the root directory of the project.
 """
 
+import json
 import logging
+import queue
 import ssl
+import threading
+import time
 from json.decoder import JSONDecodeError
+from typing import Dict, Optional
 
-from PyQt6.QtCore import Qt, pyqtSignal, pyqtSlot
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
 
 import arcane_viewer.arcane as arcane
 
@@ -24,14 +29,89 @@ class EventsThread(ClientBaseThread):
     def __init__(self, session: arcane.Session) -> None:
         super().__init__(session, arcane.WorkerKind.Events)
 
+        # Mouse moves are coalesced: only the most recent position is kept until it can be sent without exceeding the
+        # configured rate. Any other event first flushes the pending move so the original order is preserved.
+        self.pending_mouse_move: Optional[dict] = None
+        self.last_mouse_move_time = 0.0
+
+        mouse_move_rate = session.option_mouse_move_rate
+        self.mouse_move_interval = 1 / mouse_move_rate if mouse_move_rate > 0 else 0.0
+
+        self.mouse_move_timer = QTimer(self)
+        self.mouse_move_timer.setSingleShot(True)
+        self.mouse_move_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.mouse_move_timer.timeout.connect(self.flush_mouse_move)
+
+        # Events are not written to the socket by the caller (GUI thread) but queued and written by a dedicated sender
+        # thread, so a slow link never freezes the user interface. Once the queue is saturated (link stalled), mouse
+        # moves are dropped but state-changing events (buttons, keys...) are always queued, otherwise a button or a
+        # modifier could stay pressed on the remote machine.
+        self.outbound_queue: queue.Queue[dict] = queue.Queue()
+        self.sender_thread: Optional[threading.Thread] = None
+
+        # Backpressure metrics (See `outbound_stats`)
+        self.events_sent = 0
+        self.events_dropped = 0
+        self.bytes_sent = 0
+        self.writes = 0
+        self.max_queue_depth = 0
+
+        # Drop warnings are rate-limited (see `enqueue_event`)
+        self.last_drop_warning_time = 0.0
+        self.drops_since_warning = 0
+
     def client_execute(self) -> None:
         """ Execute the client thread """
         if self.client is None:
             return
 
+        self.sender_thread = threading.Thread(target=self.sender_execute, args=(self.client, ),
+                                              name="ArcaneEventsSender", daemon=True)
+        self.sender_thread.start()
+        try:
+            self.receive_events(self.client)
+        finally:
+            self._running = False
+
+            self.sender_thread.join()
+
+    def sender_execute(self, client: arcane.Client) -> None:
+        """ Write queued events to the socket, every event already queued is packed in the same write (up to
+        `EVENTS_MAX_WRITE_SIZE` bytes) """
+        while self._running:
+            try:
+                event = self.outbound_queue.get(timeout=0.25)
+            except queue.Empty:
+                continue
+
+            batch = bytearray()
+            events = 0
+            while True:
+                batch += json.dumps(event).encode('utf-8') + b'\r\n'
+                events += 1
+
+                if len(batch) >= arcane.EVENTS_MAX_WRITE_SIZE:
+                    break
+
+                try:
+                    event = self.outbound_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                client.write(bytes(batch))
+            except (OSError, ssl.SSLError):
+                break
+
+            self.events_sent += events
+            self.bytes_sent += len(batch)
+            self.writes += 1
+
+    def receive_events(self, client: arcane.Client) -> None:
+        """ Read and handle events sent by the server """
         while self._running:
             try:
-                event = self.client.read_json()
+                event = client.read_json()
             except JSONDecodeError:
                 continue
             except (OSError, ssl.SSLError, ssl.SSLEOFError):
@@ -89,42 +169,115 @@ class EventsThread(ClientBaseThread):
 
                 self.update_clipboard.emit(event["Text"])
 
+    def enqueue_event(self, event: dict, droppable: bool = False) -> bool:
+        """ Queue an event for the sender thread, never blocks. A droppable event (mouse move) is dropped and counted if
+        the queue is saturated (link stalled) """
+        if droppable and self.outbound_queue.qsize() >= arcane.EVENTS_OUTBOUND_QUEUE_SIZE:
+            self.events_dropped += 1
+            self.drops_since_warning += 1
+
+            now = time.monotonic()
+            if now - self.last_drop_warning_time >= arcane.EVENTS_DROP_WARNING_INTERVAL:
+                logger.warning(f"Outbound events queue is saturated, {self.drops_since_warning} mouse move(s) dropped")
+
+                self.last_drop_warning_time = now
+                self.drops_since_warning = 0
+
+            return False
+
+        self.outbound_queue.put_nowait(event)
+
+        self.max_queue_depth = max(self.max_queue_depth, self.outbound_queue.qsize())
+
+        return True
+
+    def send_event(self, event: dict) -> None:
+        """ Send an event to the server, right after the pending mouse move (if any) """
+        if self.client is None or not self._connected:
+            return
+
+        self.flush_mouse_move(True)
+
+        self.enqueue_event(event)
+
+    def flush_mouse_move(self, force: bool = False) -> None:
+        """ Send the pending (most recent) mouse move if any. Unless forced, if the sender thread is still busy with
+        previous events, the move is held back a little longer so it can be merged with the next ones """
+        self.mouse_move_timer.stop()
+
+        if self.pending_mouse_move is None or self.client is None or not self._connected:
+            return
+
+        if not force and not self.outbound_queue.empty():
+            self.mouse_move_timer.start(max(1, round(self.mouse_move_interval * 1000)))
+
+            return
+
+        event = self.pending_mouse_move
+        self.pending_mouse_move = None
+
+        self.last_mouse_move_time = time.monotonic()
+
+        self.enqueue_event(event, droppable=True)
+
+    def outbound_stats(self) -> Dict[str, int]:
+        """ Outbound events metrics (Sender thread backpressure) """
+        return {
+            "queue_depth": self.outbound_queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "events_sent": self.events_sent,
+            "events_dropped": self.events_dropped,
+            "bytes_sent": self.bytes_sent,
+            "writes": self.writes,
+        }
+
+    def queue_mouse_move(self, event: dict) -> None:
+        """ Send the mouse move right away if the rate allows it, otherwise keep it for later (overriding any previously
+        pending move) """
+        self.pending_mouse_move = event
+
+        remaining = self.mouse_move_interval - (time.monotonic() - self.last_mouse_move_time)
+        if remaining <= 0:
+            self.flush_mouse_move()
+        elif not self.mouse_move_timer.isActive():
+            self.mouse_move_timer.start(max(1, round(remaining * 1000)))
+
     @pyqtSlot(int, int, arcane.MouseState, arcane.MouseButton)
     def send_mouse_event(self, x: int, y: int, state: arcane.MouseState, button: arcane.MouseButton) -> None:
         """ Send mouse event to the server """
-        if self.client is not None and self._connected:
-            self.client.write_json(
-                {
-                    "Id": arcane.OutputEvent.MouseClickMove.name,
-                    "X": x,
-                    "Y": y,
-                    "Button": button.name,
-                    "Type": state.name,
-                }
-            )
+        event = {
+            "Id": arcane.OutputEvent.MouseClickMove.name,
+            "X": x,
+            "Y": y,
+            "Button": button.name,
+            "Type": state.name,
+        }
+
+        if state == arcane.MouseState.Move:
+            self.queue_mouse_move(event)
+        else:
+            self.send_event(event)
 
     @pyqtSlot(str)
     def send_key_event(self, keys: str, is_shortcut: bool) -> None:
         """ Send keyboard event to the server """
-        if self.client is not None and self._connected:
-            self.client.write_json(
-                {
-                    "Id": arcane.OutputEvent.Keyboard.name,
-                    "IsShortcut": is_shortcut,
-                    "Keys": keys,
-                }
-            )
+        self.send_event(
+            {
+                "Id": arcane.OutputEvent.Keyboard.name,
+                "IsShortcut": is_shortcut,
+                "Keys": keys,
+            }
+        )
 
     @pyqtSlot(int)
     def send_mouse_wheel_event(self, delta: int) -> None:
         """ Send mouse wheel event to the server """
-        if self.client is not None and self._connected:
-            self.client.write_json(
-                {
-                    "Id": arcane.OutputEvent.MouseWheel.name,
-                    "Delta": delta,
-                }
-            )
+        self.send_event(
+            {
+                "Id": arcane.OutputEvent.MouseWheel.name,
+                "Delta": delta,
+            }
+        )
 
     @pyqtSlot(str)
     def send_clipboard_text(self, text: str) -> None:
@@ -134,10 +287,9 @@ class EventsThread(ClientBaseThread):
         }:
             return
 
-        if self.client is not None and self._connected:
-            self.client.write_json(
-                {
-                    "Id": arcane.OutputEvent.ClipboardUpdated.name,
-                    "Text": text,
-                }
-            )
+        self.send_event(
+            {
+                "Id": arcane.OutputEvent.ClipboardUpdated.name,
+                "Text": text,
+            }
+        )
@@ -5,36 +5,187 @@
 """
 
 import logging
-import struct
+import threading
+import time
 from typing import List  # To support python <= 3.8, we need to use `List`
-from typing import Optional
+from typing import Callable, Optional, Tuple, Union
 
-from PyQt6.QtCore import QByteArray, QEventLoop, pyqtSignal, pyqtSlot
+from PyQt6.QtCore import QEventLoop, QRect, pyqtSignal, pyqtSlot
 from PyQt6.QtGui import QImage
 
 import arcane_viewer.arcane as arcane
 
 from .client_base import ClientBaseThread
+from .decoder import DirtyRectDecoder
 
 logger = logging.getLogger(__name__)
 
 
+def desktop_options(screen_name: str, session: Union[arcane.Session, arcane.DetachedSession]) -> dict:
+    """ Streaming options sent to the desktop worker once the screen is selected """
+    return {
+        "ScreenName": screen_name,
+        "ImageCompressionQuality": session.option_image_quality,
+        "PacketSize": session.option_packet_size.value,
+        "BlockSize": session.option_block_size.value,
+    }
+
+
+def stream_dirty_rects(client: arcane.Client, decoder: DirtyRectDecoder, metrics: arcane.StreamMetrics,
+                       is_running: Callable[[], bool], on_screen_updated: Callable[[dict], None]) -> None:
+    """ Read dirty rects from the socket and hand them over to the decoder, until the connection is closed or
+    `is_running` returns False """
+    header_buffer = bytearray(arcane.DIRTY_RECT_HEADER.size)
+    header_view = memoryview(header_buffer)
+
+    while is_running():
+        try:
+            client.read_exact_into(header_view)
+        except OSError:
+            break
+
+        chunk_size, x, y, screen_updated = arcane.DIRTY_RECT_HEADER.unpack_from(header_buffer)
+
+        if bool(screen_updated):
+            screen_information = client.read_json()
+
+            # Chunks still in the decoder belong to the previous screen, they must be painted before the virtual
+            # desktop is reset
+            decoder.flush()
+
+            on_screen_updated(screen_information)
+
+            continue
+
+        # Chunk is directly received into a buffer owned by the decoder (blocks if too many chunks are pending)
+        chunk_buffer = decoder.acquire_buffer(chunk_size)
+        try:
+            with memoryview(chunk_buffer) as chunk_view:
+                client.read_exact_into(chunk_view[:chunk_size])
+        except BaseException:
+            # Connection lost in the middle of the chunk, buffer and its budget reservation are given back
+            decoder.release_buffer(chunk_buffer, chunk_size)
+
+            raise
+
+        metrics.add_received(arcane.DIRTY_RECT_HEADER.size + chunk_size)
+
+        decoder.submit(chunk_buffer, chunk_size, x, y)
+
+
 class VirtualDesktopThread(ClientBaseThread):
     """ Thread to handle remote desktop streaming, at quantum level """
     open_cellar_door = pyqtSignal(arcane.Screen)
     request_screen_selection_dialog_signal = pyqtSignal(list)
-    received_dirty_rect_signal = pyqtSignal(QImage, int, int)
+    chunks_queued_signal = pyqtSignal()
+    regions_dirty_signal = pyqtSignal()
     start_events_worker_signal = pyqtSignal()
 
-    def __init__(self, session: arcane.Session) -> None:
+    def __init__(self, session: arcane.Session, preferred_screen_name: Optional[str] = None,
+                 render_scale: float = 1.0) -> None:
         super().__init__(session, arcane.WorkerKind.Desktop)
 
         self.selected_screen: Optional[arcane.Screen] = None
         self.event_loop: Optional[QEventLoop] = None
+        self.decoder: Optional[DirtyRectDecoder] = None
+
+        # When the desktop worker is attached again (E.g. full resolution resync), the previously selected screen is
+        # reused instead of asking the user again
+        self.preferred_screen_name = preferred_screen_name
+
+        # Scale chunks are decoded at (1.0 = remote screen resolution)
+        self.render_scale = render_scale
+
+        # Direct blitting (see `set_blit_target`), regions drawn since the GUI thread last collected them
+        self.blit_target: Optional[Callable[[QImage, int, int, float], QRect]] = None
+        self.dirty_regions: List[QRect] = []
+        self.dirty_regions_lock = threading.Lock()
+
+        # Chunks are decoded into images given back once painted (see `recycle_chunks`)
+        self.image_pool = arcane.ImagePool(
+            session.option_block_size.value, arcane.VD_DECODE_MAX_IN_FLIGHT, cache=session.chunk_cache
+        )
+
+        # Memory held by chunks between the socket, decode and paint stages is bounded, decoded chunks wait for the GUI
+        # thread in `chunk_queue` (see `take_chunks`)
+        self.budget = arcane.PipelineBudget(session.option_pipeline_budget * 1024 * 1024)
+        self.chunk_queue = arcane.ChunkQueue(self.budget, session.option_pipeline_overflow, self.image_pool)
+
+        # Set by the GUI thread once the virtual desktop is ready for the selected screen (see `open_cellar_door`)
+        self.cellar_door_ready = threading.Event()
+
+    def set_render_scale(self, scale: float) -> None:
+        """ Change the scale chunks are decoded at, applies to chunks received from now on """
+        self.render_scale = scale
+
+        if self.decoder is not None:
+            self.decoder.scale = scale
+
+    def set_blit_target(self, blit_target: Optional[Callable[[QImage, int, int, float], QRect]]) -> None:
+        """ When a (thread-safe) blit target is set, decoded chunks are directly drawn into the virtual desktop backing
+        store from the decoder and only the dirty regions are handed over to the GUI thread (`take_dirty_regions`).
+        Otherwise, chunks are queued for the GUI thread (`take_chunks`) """
+        self.blit_target = blit_target
+
+    def take_chunks(self) -> List[Tuple[QImage, int, int, float]]:
+        """ Return decoded chunks queued since last call (in order) """
+        return self.chunk_queue.take()
+
+    def recycle_chunks(self, chunks: List[Tuple[QImage, int, int, float]]) -> None:
+        """ Give images of painted chunks back to the image pool """
+        for chunk, _, _, _ in chunks:
+            self.image_pool.release(chunk)
+
+    def take_dirty_regions(self) -> List[QRect]:
+        """ Return regions drawn since last call and reset them """
+        with self.dirty_regions_lock:
+            dirty_regions = self.dirty_regions
+            self.dirty_regions = []
+
+        return dirty_regions
+
+    def on_decoded(self, chunk: QImage, x: int, y: int, scale: float) -> None:
+        """ Called (in order) from the decoder dispatcher thread for each decoded chunk """
+        blit_target = self.blit_target
+        if blit_target is None:
+            # The GUI thread is only notified once until it collects queued chunks
+            if self.chunk_queue.put(chunk, x, y, scale):
+                self.chunks_queued_signal.emit()
+
+            return
+
+        start = time.perf_counter()
+
+        dirty_region = blit_target(chunk, x, y, scale)
+
+        self.session.metrics.add_blitted(time.perf_counter() - start)
+
+        self.image_pool.release(chunk)
+
+        self.add_dirty_regions([dirty_region])
+
+    def add_dirty_regions(self, dirty_regions: List[QRect]) -> None:
+        """ Record regions already drawn into the backing store, the GUI thread is only notified once until it collects
+        them, whatever the number of regions added in between """
+        with self.dirty_regions_lock:
+            notify = not self.dirty_regions
+            self.dirty_regions.extend(dirty_regions)
+
+        if notify:
+            self.regions_dirty_signal.emit()
 
     def open_or_refresh_cellar_door(self) -> None:
-        if self.selected_screen is not None:
-            self.open_cellar_door.emit(self.selected_screen)
+        if self.selected_screen is None:
+            return
+
+        self.cellar_door_ready.clear()
+
+        self.open_cellar_door.emit(self.selected_screen)
+
+        # Virtual desktop must first be (re)sized for the selected screen, otherwise chunks of the new screen could be
+        # drawn (directly or from the queue) into the previous one.
+        while self._running and not self.cellar_door_ready.wait(0.1):
+            pass
 
     """`Destruction is a form of creation. So the fact they burn the money is ironic. They just want to see what happens
      when they tear the world apart. They want to change things.`, Donnie Darko"""
@@ -46,8 +197,12 @@ class VirtualDesktopThread(ClientBaseThread):
         screens = [arcane.Screen(screen) for screen in screens_obj["List"]]
         logger.info(f"{len(screens)} screen(s) detected")
 
+        preferred_screens = [screen for screen in screens if screen.name == self.preferred_screen_name]
+
         if len(screens) == 1:
             self.selected_screen = screens[0]
+        elif preferred_screens:
+            self.selected_screen = preferred_screens[0]
         else:
             self.display_screen_selection_dialog(screens)
 
@@ -57,14 +212,7 @@ class VirtualDesktopThread(ClientBaseThread):
         logger.info(f"Screen: {self.selected_screen.name} "
                     f"({self.selected_screen.width}x{self.selected_screen.height})")
 
-        self.client.write_json(
-            {
-                "ScreenName": self.selected_screen.name,
-                "ImageCompressionQuality": self.session.option_image_quality,
-                "PacketSize": self.session.option_packet_size.value,
-                "BlockSize": self.session.option_block_size.value,
-            }
-        )
+        self.client.write_json(desktop_options(self.selected_screen.name, self.session))
 
         """ Open Cellar Door
         `This famous linguist once said, of all the phrases in the English language, of all the endless combinations
@@ -73,44 +221,39 @@ class VirtualDesktopThread(ClientBaseThread):
 
         self.start_events_worker_signal.emit()
 
-        packet_max_size = self.session.option_packet_size.value
-        while self._running:
-            try:
-                chunk_size, x, y, screen_updated = struct.unpack('IIIB', self.client.conn.read(13))
-            except (Exception, ):
-                break
-
-            if bool(screen_updated):
-                self.selected_screen = arcane.Screen(self.client.read_json())
-
-                self.open_or_refresh_cellar_door()
-
-                continue
-
-            chunk_bytes = QByteArray()
-            bytes_read = 0
-            while bytes_read < chunk_size:
-                packet_size = min(packet_max_size, chunk_size - bytes_read)
-                b = self.client.conn.recv(packet_size)
-                if not b:
-                    break
-
-                bytes_read += len(b)
-
-                chunk_bytes.append(b)
+        # Chunks are decoded by a pool of worker threads while we keep reading from the socket, decoded chunks are
+        # then queued or directly drawn (in order) from the decoder dispatcher thread.
+        self.decoder = DirtyRectDecoder(
+            self.on_decoded,
+            metrics=self.session.metrics,
+            scale=self.render_scale,
+            budget=self.budget,
+            drop_superseded=self.session.option_pipeline_overflow == arcane.OverflowPolicy.DropSuperseded,
+            cache=self.session.chunk_cache,
+            pool=self.image_pool,
+        )
+        try:
+            stream_dirty_rects(
+                self.client,
+                self.decoder,
+                self.session.metrics,
+                lambda: self._running,
+                self.on_screen_updated,
+            )
+        finally:
+            self.decoder.close()
 
-            chunk = QImage()
-            chunk.loadFromData(chunk_bytes)
+    def on_screen_updated(self, screen_information: dict) -> None:
+        self.selected_screen = arcane.Screen(screen_information)
 
-            self.received_dirty_rect_signal.emit(
-                chunk,
-                x,
-                y,
-            )
+        self.open_or_refresh_cellar_door()
 
     def stop(self) -> None:
         super().stop()
 
+        # Socket thread might be waiting for the GUI thread to paint queued chunks
+        self.budget.close()
+
         if self.event_loop is not None:
             self.event_loop.quit()
 
@@ -0,0 +1,66 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import ssl
+import threading
+from typing import Dict, Optional
+
+
+def create_ssl_context() -> ssl.SSLContext:
+    """ SSL context used to connect to the remote server (server certificate is checked by its fingerprint) """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    return context
+
+
+class TLSSessionCache:
+    """ SSL context shared by every connection of a session (session request, desktop and events workers). The latest
+    TLS session negotiated with the server is offered by each new connection, so the server can resume it (abbreviated
+    handshake) instead of performing a full handshake.
+
+    Things to note:
+        * A TLS session can only be resumed with the context it was created from, this is why the context is shared.
+        * With TLS 1.3, session tickets are sent by the server after the handshake, the session is therefore only
+        stored once the connection exchanged some data (see `update`).
+    """
+    def __init__(self) -> None:
+        self.context = create_ssl_context()
+
+        self._lock = threading.Lock()
+        self._session: Optional[ssl.SSLSession] = None
+
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+
+    @property
+    def session(self) -> Optional[ssl.SSLSession]:
+        with self._lock:
+            return self._session
+
+    def add_handshake(self, resumed: bool) -> None:
+        with self._lock:
+            if resumed:
+                self.resumed_handshakes += 1
+            else:
+                self.full_handshakes += 1
+
+    def update(self, conn: ssl.SSLSocket) -> None:
+        """ Store the TLS session of an established connection, to be resumed by the next one """
+        session = conn.session
+        if session is None:
+            return
+
+        with self._lock:
+            self._session = session
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "tls_full_handshakes": self.full_handshakes,
+                "tls_resumed_handshakes": self.resumed_handshakes,
+            }
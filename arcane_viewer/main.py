@@ -18,6 +18,7 @@
 """
 
 import logging
+import multiprocessing
 import sys
 import threading
 
@@ -29,6 +30,9 @@ import arcane_viewer.ui.forms as arcane_forms
 
 
 def main() -> None:
+    # Required by the desktop engine process in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     logging.basicConfig(
                         level=logging.DEBUG,
                         format="%(asctime)s - %(name)s[%(thread)d] - %(levelname)s - %(message)s"
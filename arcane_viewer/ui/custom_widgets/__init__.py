@@ -4,8 +4,14 @@ __email__ = "jplesueur@phrozen.io"
 __copyright__ = "Copyright 2024, Phrozen"
 __license__ = "Apache License 2.0"
 
+from .damage_tracker import DamageTracker
+from .framebuffer_item import FramebufferItem
+from .shared_framebuffer_item import SharedFramebufferItem
 from .tangeant_universe import TangentUniverse
 
 __all__ = [
+    'DamageTracker',
+    'FramebufferItem',
+    'SharedFramebufferItem',
     'TangentUniverse',
 ]
@@ -0,0 +1,75 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+from typing import List
+
+from PyQt6.QtCore import QRect
+
+
+class DamageTracker:
+    """ Collect the dirty rects of the virtual desktop between two scene refreshes and reduce them to a small set of
+    bounding rects, so the view does not have to repaint every single block on its own.
+
+    Things to note:
+        * A new rect is merged with an already tracked one when their union does not cover much more surface than
+        the two rects themselves. Adjacent blocks (E.g. a scrolling text editor) are therefore merged into a single
+        rect, row after row.
+        * `QRegion` would be the natural candidate, but PyQt6 does not expose a way to iterate over its rects.
+        * If damage remains too fragmented, as a last resort it is reduced to its bounding rect.
+    """
+    def __init__(self, max_rects: int = 16, max_waste_ratio: float = 1.25) -> None:
+        self.max_rects = max_rects
+        self.max_waste_ratio = max_waste_ratio
+
+        self.rects: List[QRect] = []
+
+    @staticmethod
+    def _area(rect: QRect) -> int:
+        return rect.width() * rect.height()
+
+    def _mergeable(self, a: QRect, b: QRect) -> bool:
+        covered = self._area(a) + self._area(b) - self._area(a.intersected(b))
+
+        return self._area(a.united(b)) <= covered * self.max_waste_ratio
+
+    def add(self, rect: QRect) -> None:
+        # Once merged, the new rect might now be mergeable with other tracked rects, so we loop until it is stable.
+        merged = True
+        while merged:
+            merged = False
+            for i, candidate in enumerate(self.rects):
+                if self._mergeable(candidate, rect):
+                    rect = candidate.united(rect)
+                    del self.rects[i]
+
+                    merged = True
+
+                    break
+
+        self.rects.append(rect)
+
+        if len(self.rects) > self.max_rects:
+            self.rects = [self.bounding_rect()]
+
+    def bounding_rect(self) -> QRect:
+        bounding_rect = QRect()
+        for rect in self.rects:
+            bounding_rect = bounding_rect.united(rect)
+
+        return bounding_rect
+
+    def is_empty(self) -> bool:
+        return not self.rects
+
+    def clear(self) -> None:
+        self.rects = []
+
+    def take(self) -> List[QRect]:
+        """ Return the damaged rects and reset the tracker """
+        rects = self.rects
+        self.clear()
+
+        return rects
@@ -0,0 +1,273 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+import math
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from PyQt6.QtCore import QPoint, QRect, QRectF, QSize, Qt
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem, QWidget
+
+import arcane_viewer.arcane as arcane
+import arcane_viewer.arcane.threads as arcane_threads
+
+
+class FramebufferItem(QGraphicsItem):
+    """ Scene item holding the remote desktop framebuffer
+
+    Things to note:
+        * Unlike a `QGraphicsPixmapItem`, the item owns its backing store which is updated in place: there is no
+        `setPixmap` call (and so no implicitly shared copy to detach) on each update, and only the exposed part of the
+        framebuffer is painted.
+        * The backing store is a grid of fixed-size tiles allocated on first write (a tile never written is painted
+        black). A chunk only touches the tiles it overlaps, so the cost of an update does not depend on the remote
+        screen size (5K / 8K or ultra-wide remote desktops).
+        * When the remote screen is resized, tiles still within bounds are kept as they are.
+        * `content_scale` is the lowest scale content currently held by the backing store was drawn (or resampled) at,
+        content below the current scale looks blurry until it is received again.
+        * The item geometry always matches the remote screen, but the backing store can be kept at a lower scale
+        (chunks decoded at display resolution). Tiles are then addressed in backing store coordinates and stretched
+        back to the item geometry when painted.
+        * The backing store can be written from another thread than the GUI thread (see `blit`). Each tile has its own
+        lock, held by the writer while drawing into it and by `paint` while reading it, so painting one region never
+        waits for a write to another region. Tile grid changes (`resize`, `set_scale`) and writes are serialized by
+        `lock`.
+    """
+    def __init__(self, size: QSize, tile_size: int = arcane.VD_FRAMEBUFFER_TILE_SIZE, store_scale: float = 1.0) -> None:
+        super().__init__()
+
+        self.tile_size = tile_size
+        self.size = QSize(size)
+        self.store_scale = store_scale
+        self.content_scale: Optional[float] = None
+
+        self.tiles: Dict[Tuple[int, int], QImage] = {}
+        self.tile_locks: Dict[Tuple[int, int], threading.Lock] = {}
+
+        self.lock = threading.RLock()
+
+        # Required to receive the exposed rect in `paint` option
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+
+    def rect(self) -> QRect:
+        return QRect(QPoint(0, 0), self.size)
+
+    def store_rect(self) -> QRect:
+        """ Backing store bounds (item bounds at framebuffer scale) """
+        return arcane_threads.scale_rect(self.rect(), self.store_scale)
+
+    def to_store_rect(self, rect: QRect) -> QRect:
+        """ Map a rect from item to backing store coordinates, the result covers the whole source rect """
+        if self.store_scale == 1.0:
+            return QRect(rect)
+
+        return QRectF(
+            rect.x() * self.store_scale,
+            rect.y() * self.store_scale,
+            rect.width() * self.store_scale,
+            rect.height() * self.store_scale,
+        ).toAlignedRect()
+
+    def to_item_rect(self, rect: QRect) -> QRectF:
+        """ Map a rect from backing store to item coordinates """
+        if self.store_scale == 1.0:
+            return QRectF(rect)
+
+        return QRectF(
+            rect.x() / self.store_scale,
+            rect.y() / self.store_scale,
+            rect.width() / self.store_scale,
+            rect.height() / self.store_scale,
+        )
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(self.rect())
+
+    def resize(self, size: QSize) -> None:
+        """ Resize the framebuffer, tiles outside of the new bounds are released, others are kept """
+        if size == self.size:
+            return
+
+        self.prepareGeometryChange()
+
+        with self.lock:
+            self.size = QSize(size)
+
+            self.release_out_of_bounds_tiles()
+
+    def release_out_of_bounds_tiles(self) -> None:
+        store_rect = self.store_rect()
+
+        columns = (store_rect.width() + self.tile_size - 1) // self.tile_size
+        rows = (store_rect.height() + self.tile_size - 1) // self.tile_size
+
+        self.tiles = {key: tile for key, tile in self.tiles.items() if key[0] < columns and key[1] < rows}
+        self.tile_locks = {key: self.tile_locks[key] for key in self.tiles}
+
+    def set_scale(self, scale: float) -> None:
+        """ Change the backing store scale, current content is resampled to the new scale (it will look blurry after
+        an upscale until chunks are received again at the new scale) """
+        with self.lock:
+            self._set_scale(scale)
+
+    def _set_scale(self, scale: float) -> None:
+        if scale == self.store_scale:
+            return
+
+        ratio = scale / self.store_scale
+
+        old_tiles = self.tiles
+        old_tile_locks = self.tile_locks
+
+        # Tiles are replaced, a concurrent `paint` still holding an old tile will simply draw the previous content
+        self.store_scale = scale
+
+        if self.content_scale is not None:
+            self.content_scale = min(self.content_scale, scale)
+        self.tiles = {}
+        self.tile_locks = {}
+
+        painters: Dict[Tuple[int, int], QPainter] = {}
+        try:
+            for old_key, old_tile in old_tiles.items():
+                old_tile_rect = self.tile_rect(old_key)
+                target = QRectF(
+                    old_tile_rect.x() * ratio,
+                    old_tile_rect.y() * ratio,
+                    old_tile_rect.width() * ratio,
+                    old_tile_rect.height() * ratio,
+                )
+
+                for key in self.tile_keys(target.toAlignedRect()):
+                    painter = painters.get(key)
+                    if painter is None:
+                        painter = QPainter(self.tile(key))
+                        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, True)
+                        painters[key] = painter
+
+                    with old_tile_locks[old_key]:
+                        painter.drawImage(target.translated(-QRectF(self.tile_rect(key)).topLeft()), old_tile)
+        finally:
+            for painter in painters.values():
+                painter.end()
+
+    def reset_content_scale(self) -> None:
+        """ Content is about to be received again at the current scale """
+        with self.lock:
+            self.content_scale = None
+
+    def tile_keys(self, rect: QRect) -> Iterator[Tuple[int, int]]:
+        """ Iterate over the tiles (column, row) overlapped by the given rect (backing store coordinates) """
+        rect = rect.intersected(self.store_rect())
+        if rect.isEmpty():
+            return
+
+        for row in range(rect.top() // self.tile_size, rect.bottom() // self.tile_size + 1):
+            for column in range(rect.left() // self.tile_size, rect.right() // self.tile_size + 1):
+                yield column, row
+
+    def tile_rect(self, key: Tuple[int, int]) -> QRect:
+        return QRect(key[0] * self.tile_size, key[1] * self.tile_size, self.tile_size, self.tile_size)
+
+    def tile(self, key: Tuple[int, int]) -> QImage:
+        """ Get (or allocate on first use) the given tile """
+        tile = self.tiles.get(key)
+        if tile is None:
+            tile = QImage(self.tile_size, self.tile_size, arcane.VD_FRAMEBUFFER_FORMAT)
+            tile.fill(Qt.GlobalColor.black)
+
+            self.tile_locks[key] = threading.Lock()
+            self.tiles[key] = tile
+
+        return tile
+
+    def chunk_store_rect(self, chunk: QImage, x: int, y: int, chunk_scale: float) -> QRect:
+        """ Where a chunk decoded at `chunk_scale` lands in the backing store """
+        if chunk_scale == self.store_scale:
+            return QRect(
+                QPoint(math.floor(x * self.store_scale), math.floor(y * self.store_scale)),
+                chunk.size(),
+            )
+
+        # Chunk was decoded before a scale change, it is stretched to the current scale
+        return arcane_threads.scale_rect(
+            QRect(x, y, round(chunk.width() / chunk_scale), round(chunk.height() / chunk_scale)),
+            self.store_scale,
+        )
+
+    def compose(self, chunks: List[Tuple[QImage, int, int, float]]) -> List[QRect]:
+        """ Draw chunks (in order) into the tiles they overlap, a single painter is opened per touched tile. Return the
+        rect of every drawn chunk (item coordinates) """
+        with self.lock:
+            return self._compose(chunks)
+
+    def _compose(self, chunks: List[Tuple[QImage, int, int, float]]) -> List[QRect]:
+        painters: Dict[Tuple[int, int], QPainter] = {}
+        dirty_rects = []
+        try:
+            for chunk, x, y, chunk_scale in chunks:
+                store_rect = self.chunk_store_rect(chunk, x, y, chunk_scale)
+                stretched = store_rect.size() != chunk.size()
+
+                for key in self.tile_keys(store_rect):
+                    painter = painters.get(key)
+                    if painter is None:
+                        tile = self.tile(key)
+
+                        # Tile lock is held until the painter is done with the tile
+                        self.tile_locks[key].acquire()
+
+                        painter = QPainter(tile)
+                        painters[key] = painter
+
+                    # Drawing is naturally clipped to the tile bounds
+                    tile_offset = self.tile_rect(key).topLeft()
+                    if stretched:
+                        painter.drawImage(store_rect.translated(-tile_offset), chunk)
+                    else:
+                        painter.drawImage(store_rect.topLeft() - tile_offset, chunk)
+
+                dirty_rects.append(self.to_item_rect(store_rect).toAlignedRect())
+
+                self.content_scale = chunk_scale if self.content_scale is None else min(self.content_scale, chunk_scale)
+        finally:
+            for key, painter in painters.items():
+                painter.end()
+
+                self.tile_locks[key].release()
+
+        return dirty_rects
+
+    def blit(self, chunk: QImage, x: int, y: int, chunk_scale: float) -> QRect:
+        """ Thread-safe: draw a single chunk into the backing store, return its dirty rect (item coordinates) """
+        return self.compose([(chunk, x, y, chunk_scale)])[0]
+
+    def paint(self, painter: Optional[QPainter], option: Optional[QStyleOptionGraphicsItem],
+              widget: Optional[QWidget] = None) -> None:
+        if painter is None:
+            return
+
+        exposed_rect = self.rect()
+        if option is not None:
+            exposed_rect = option.exposedRect.toAlignedRect().intersected(exposed_rect)
+
+        store_exposed_rect = self.to_store_rect(exposed_rect)
+
+        for key in self.tile_keys(store_exposed_rect):
+            tile_rect = self.tile_rect(key)
+            source_rect = tile_rect.intersected(store_exposed_rect)
+            target_rect = self.to_item_rect(source_rect)
+
+            tile = self.tiles.get(key)
+            tile_lock = self.tile_locks.get(key)
+            if tile is None or tile_lock is None:
+                painter.fillRect(target_rect, Qt.GlobalColor.black)
+
+                continue
+
+            with tile_lock:
+                painter.drawImage(target_rect, tile, QRectF(source_rect.translated(-tile_rect.topLeft())))
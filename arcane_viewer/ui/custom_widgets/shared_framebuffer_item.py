@@ -0,0 +1,56 @@
+"""
+    Author: Jean-Pierre LESUEUR (@DarkCoderSc)
+    License: Apache License 2.0
+    More information about the LICENSE on the LICENSE file in the root directory of the project.
+"""
+
+from typing import Optional
+
+from PyQt6.QtCore import QRect, QRectF, QSize
+from PyQt6.QtGui import QPainter
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem, QWidget
+
+import arcane_viewer.arcane as arcane
+
+
+class SharedFramebufferItem(QGraphicsItem):
+    """ Scene item painting the remote desktop from the framebuffer shared by the desktop engine process, the item
+    never writes to it """
+    def __init__(self, framebuffer: arcane.SharedFramebuffer) -> None:
+        super().__init__()
+
+        self.framebuffer: Optional[arcane.SharedFramebuffer] = framebuffer
+
+        # Required to receive the exposed rect in `paint` option
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+
+    def size(self) -> QSize:
+        return self.framebuffer.size if self.framebuffer is not None else QSize()
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(self.framebuffer.rect()) if self.framebuffer is not None else QRectF()
+
+    def set_framebuffer(self, framebuffer: arcane.SharedFramebuffer) -> None:
+        """ Switch to a new framebuffer (E.g. remote screen resized), the previous one is released """
+        self.prepareGeometryChange()
+
+        self.release()
+
+        self.framebuffer = framebuffer
+
+    def release(self) -> None:
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+
+            self.framebuffer = None
+
+    def paint(self, painter: Optional[QPainter], option: Optional[QStyleOptionGraphicsItem],
+              widget: Optional[QWidget] = None) -> None:
+        if painter is None or self.framebuffer is None:
+            return
+
+        exposed_rect: QRect = self.framebuffer.rect()
+        if option is not None:
+            exposed_rect = option.exposedRect.toAlignedRect().intersected(exposed_rect)
+
+        self.framebuffer.draw(painter, exposed_rect)
@@ -9,10 +9,11 @@
 """
 
 import logging
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
-from PyQt6.QtCore import Qt, pyqtSlot
-from PyQt6.QtGui import QClipboard, QKeyEvent, QMouseEvent, QWheelEvent
+from PyQt6.QtCore import QRectF, Qt, pyqtSignal, pyqtSlot
+from PyQt6.QtGui import (QClipboard, QColor, QKeyEvent, QMouseEvent, QPainter,
+                         QResizeEvent, QTransform, QWheelEvent)
 from PyQt6.QtWidgets import QApplication, QGraphicsScene, QGraphicsView
 
 import arcane_viewer.arcane as arcane
@@ -27,6 +28,9 @@ class TangentUniverse(QGraphicsView):
     diverging veil? When the cosmic mirror distorts, do you walk the ordained spiral or the fragmented loop of the
     twilight realm?`"""
 
+    # Emitted when the virtual desktop scale factor changed (E.g. window resized)
+    geometry_changed = pyqtSignal()
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -38,6 +42,12 @@ class TangentUniverse(QGraphicsView):
         self.events_thread: Optional[arcane_threads.EventsThread] = None
         self.desktop_screen: Optional[arcane.Screen] = None
 
+        # View size, remote screen size and device pixel ratio the current transform was computed for
+        self.fitted_geometry: Optional[Tuple[int, int, int, int, float]] = None
+
+        # Text lines displayed on top of the virtual desktop (E.g. streaming metrics), None means hidden
+        self.overlay_lines: Optional[List[str]] = None
+
         # instead of doing a simple ``setScene(QGraphicsScene())``, we will keep a reference to the scene to be updated
         # and avoid slight overhead when calling `.scene()` method repeatedly.
         self.desktop_scene = QGraphicsScene()
@@ -51,6 +61,105 @@ class TangentUniverse(QGraphicsView):
         if self.desktop_scene is not None:
             self.desktop_scene.clear()
 
+        self.fitted_geometry = None
+
+    def invalidate_geometry(self) -> None:
+        """ Force the view transform to be recomputed (E.g. after the remote screen or local screen changed) """
+        self.fitted_geometry = None
+
+        self.fit_scene()
+
+    def fit_scene(self) -> None:
+        """ Fit the scene (Hacky Technique) to the view, the transform is only recomputed when the view size, the remote
+        screen size or the device pixel ratio actually changed """
+        if self.desktop_screen is None:
+            return
+
+        # Instead of bellow code:
+        #   `self.view.fitInView(self.desktop_graphics_pixmap, Qt.AspectRatioMode.IgnoreAspectRatio)`
+        # We will calculate the scale factor manually to avoid the aspect ratio issue and fitting correctly the view to
+        # our virtual desktop host window.
+        view_rect = self.frameRect()
+
+        geometry = (
+            view_rect.width(),
+            view_rect.height(),
+            self.desktop_screen.width,
+            self.desktop_screen.height,
+            self.devicePixelRatioF(),
+        )
+
+        if geometry == self.fitted_geometry:
+            return
+
+        self.fitted_geometry = geometry
+
+        scale_x = view_rect.width() / self.desktop_screen.width
+        scale_y = view_rect.height() / self.desktop_screen.height
+
+        transform = QTransform()
+        transform.scale(scale_x, scale_y)
+        self.setTransform(transform, False)
+
+        self.setSceneRect(
+            0,
+            0,
+            self.desktop_screen.width,
+            self.desktop_screen.height,
+        )
+
+        self.geometry_changed.emit()
+
+    def display_scale(self) -> float:
+        """ Ratio between physical pixels of the view and remote screen pixels (capped to 1.0), that is the lowest
+        resolution the virtual desktop can be kept at without losing any displayed detail """
+        if self.fitted_geometry is None:
+            return 1.0
+
+        view_width, view_height, screen_width, screen_height, pixel_ratio = self.fitted_geometry
+        if screen_width <= 0 or screen_height <= 0:
+            return 1.0
+
+        return min(1.0, max(view_width / screen_width, view_height / screen_height) * pixel_ratio)
+
+    def set_overlay(self, lines: Optional[List[str]]) -> None:
+        """ Display (or hide if None) text lines on top of the virtual desktop """
+        self.overlay_lines = lines
+
+        viewport = self.viewport()
+        if viewport is not None:
+            viewport.update()
+
+    def drawForeground(self, painter: Optional[QPainter], rect: QRectF) -> None:
+        """ Overridden drawForeground method to paint the overlay (in view coordinates, unaffected by scaling) """
+        super().drawForeground(painter, rect)
+
+        if painter is None or not self.overlay_lines:
+            return
+
+        painter.save()
+        try:
+            painter.resetTransform()
+
+            metrics = painter.fontMetrics()
+            line_height = metrics.height()
+            width = max(metrics.horizontalAdvance(line) for line in self.overlay_lines) + 16
+            height = line_height * len(self.overlay_lines) + 12
+
+            painter.fillRect(8, 8, width, height, QColor(0, 0, 0, 180))
+
+            painter.setPen(QColor(255, 255, 255))
+            for i, line in enumerate(self.overlay_lines):
+                painter.drawText(16, 14 + metrics.ascent() + (i * line_height), line)
+        finally:
+            painter.restore()
+
+    def resizeEvent(self, event: Optional[QResizeEvent]) -> None:
+        """ Overridden resizeEvent method to fit the scene to the view """
+        super().resizeEvent(event)
+
+        self.fit_scene()
+
     def set_event_thread(self, events_thread: arcane_threads.EventsThread) -> None:
         """ Set the events thread """
         self.events_thread = events_thread
@@ -62,6 +171,8 @@ class TangentUniverse(QGraphicsView):
         """ Set the captured screen original information """
         self.desktop_screen = screen
 
+        self.invalidate_geometry()
+
     def fix_mouse_position(self, x: Union[int, float], y: Union[int, float]) -> Tuple[int, int]:
         """ Fix the virtual desktop mouse position to the original screen position """
         x = int(x)
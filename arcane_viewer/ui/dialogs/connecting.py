@@ -50,5 +50,21 @@ class ConnectingDialog(utilities.QCenteredDialog):
         progress_bar.setRange(0, 0)
         info_layout.addWidget(progress_bar)
 
+        # Completed connection phases and their duration (E.g. DNS, TCP connect, TLS handshake)
+        self.phases_label = QLabel()
+        self.phases_label.setVisible(False)
+        info_layout.addWidget(self.phases_label)
+
         spacer_bottom = QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding)
         info_layout.addItem(spacer_bottom)
+
+    def add_connection_phase(self, phase: str, duration: float) -> None:
+        """ Show a completed connection phase below the progress bar """
+        phases = self.phases_label.text()
+        if phases:
+            phases += "\n"
+
+        self.phases_label.setText(f"{phases}{phase}: {duration * 1000:.1f} ms")
+        self.phases_label.setVisible(True)
+
+        self.adjustSize()
@@ -4,14 +4,15 @@
     More information about the LICENSE on the LICENSE file in the root directory of the project.
 """
 
-from typing import Optional, Union
+from typing import Dict, Optional, Union
 
 from PyQt6.QtCore import QModelIndex, QSettings, Qt
 from PyQt6.QtGui import QShowEvent, QStandardItem, QStandardItemModel
-from PyQt6.QtWidgets import (QComboBox, QDialog, QGridLayout, QGroupBox,
-                             QHBoxLayout, QLabel, QMainWindow, QMessageBox,
-                             QPushButton, QSizePolicy, QSpacerItem, QSpinBox,
-                             QTabWidget, QTreeView, QVBoxLayout, QWidget)
+from PyQt6.QtWidgets import (QCheckBox, QComboBox, QDialog, QGridLayout,
+                             QGroupBox, QHBoxLayout, QLabel, QMainWindow,
+                             QMessageBox, QPushButton, QSizePolicy,
+                             QSpacerItem, QSpinBox, QTabWidget, QTreeView,
+                             QVBoxLayout, QWidget)
 
 import arcane_viewer.arcane as arcane
 import arcane_viewer.ui.utilities as utilities
@@ -84,6 +85,85 @@ class RemoteDesktopOptionsTab(QWidget):
         desktop_capture_group_layout.addWidget(block_size_label, 2, 0)
         desktop_capture_group_layout.addWidget(self.block_size_input, 2, 1)
 
+        # Input Settings (Fieldset)
+        input_group = QGroupBox("Input Settings")
+        input_group_layout = QGridLayout()
+        input_group.setLayout(input_group_layout)
+        core_layout.addWidget(input_group)
+
+        input_group_layout.setContentsMargins(8, 16, 8, 8)
+
+        # Mouse Move Rate (Consecutive mouse moves are merged and sent at most `x` times per second)
+        mouse_move_rate_label = QLabel("Mouse Move Rate:")
+
+        self.mouse_move_rate_input = QSpinBox()
+        self.mouse_move_rate_input.setMinimum(0)
+        self.mouse_move_rate_input.setMaximum(1000)
+        self.mouse_move_rate_input.setSuffix(" Hz")
+        self.mouse_move_rate_input.setSpecialValueText("Unlimited")
+        self.mouse_move_rate_input.setValue(120)
+
+        input_group_layout.addWidget(mouse_move_rate_label, 0, 0)
+        input_group_layout.addWidget(self.mouse_move_rate_input, 0, 1)
+
+        # Rendering Settings (Fieldset)
+        rendering_group = QGroupBox("Rendering Settings")
+        rendering_group_layout = QGridLayout()
+        rendering_group.setLayout(rendering_group_layout)
+        core_layout.addWidget(rendering_group)
+
+        rendering_group_layout.setContentsMargins(8, 16, 8, 8)
+
+        # Decode chunks at display resolution when the window is smaller than the remote screen
+        self.decode_downscale_checkbox = QCheckBox("Decode at window resolution (lower CPU and memory usage)")
+
+        rendering_group_layout.addWidget(self.decode_downscale_checkbox, 0, 0, 1, 2)
+
+        # Decoded chunks are drawn by decoder threads instead of the GUI thread
+        self.direct_blit_checkbox = QCheckBox("Draw decoded chunks from decoder threads")
+
+        rendering_group_layout.addWidget(self.direct_blit_checkbox, 1, 0, 1, 2)
+
+        # Remote desktop is received and decoded in a separate process
+        self.engine_process_checkbox = QCheckBox("Receive and decode in a separate process")
+
+        rendering_group_layout.addWidget(self.engine_process_checkbox, 2, 0, 1, 2)
+
+        # Memory budget of chunks waiting to be decoded or painted
+        pipeline_budget_label = QLabel("Pipeline Memory:")
+
+        self.pipeline_budget_input = QSpinBox()
+        self.pipeline_budget_input.setMinimum(8)
+        self.pipeline_budget_input.setMaximum(4096)
+        self.pipeline_budget_input.setSuffix(" MiB")
+        self.pipeline_budget_input.setValue(arcane.VD_PIPELINE_BUDGET)
+
+        # What to do once the pipeline memory budget is exhausted
+        pipeline_overflow_label = QLabel("When Full:")
+
+        self.pipeline_overflow_input = QComboBox()
+        for overflow_policy in arcane.OverflowPolicy:
+            self.pipeline_overflow_input.addItem(overflow_policy.display_name, userData=overflow_policy)
+
+        rendering_group_layout.addWidget(pipeline_budget_label, 3, 0)
+        rendering_group_layout.addWidget(self.pipeline_budget_input, 3, 1)
+
+        rendering_group_layout.addWidget(pipeline_overflow_label, 4, 0)
+        rendering_group_layout.addWidget(self.pipeline_overflow_input, 4, 1)
+
+        # Identical chunks (E.g. blinking caret) are decoded only once
+        chunk_cache_size_label = QLabel("Decoded Chunk Cache:")
+
+        self.chunk_cache_size_input = QSpinBox()
+        self.chunk_cache_size_input.setMinimum(0)
+        self.chunk_cache_size_input.setMaximum(1024)
+        self.chunk_cache_size_input.setSuffix(" MiB")
+        self.chunk_cache_size_input.setSpecialValueText("Disabled")
+        self.chunk_cache_size_input.setValue(arcane.VD_CHUNK_CACHE_SIZE)
+
+        rendering_group_layout.addWidget(chunk_cache_size_label, 5, 0)
+        rendering_group_layout.addWidget(self.chunk_cache_size_input, 5, 1)
+
         core_layout.addItem(QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding))
 
     def load_settings(self) -> None:
@@ -110,6 +190,29 @@ class RemoteDesktopOptionsTab(QWidget):
             )
         )
 
+        # Load Input Options
+        self.mouse_move_rate_input.setValue(self.settings.value(arcane.SETTINGS_KEY_MOUSE_MOVE_RATE, 120, type=int))
+
+        # Load Rendering Options
+        self.decode_downscale_checkbox.setChecked(
+            self.settings.value(arcane.SETTINGS_KEY_DECODE_DOWNSCALE, False, type=bool)
+        )
+        self.direct_blit_checkbox.setChecked(self.settings.value(arcane.SETTINGS_KEY_DIRECT_BLIT, False, type=bool))
+        self.engine_process_checkbox.setChecked(
+            self.settings.value(arcane.SETTINGS_KEY_ENGINE_PROCESS, False, type=bool)
+        )
+        self.pipeline_budget_input.setValue(
+            self.settings.value(arcane.SETTINGS_KEY_PIPELINE_BUDGET, arcane.VD_PIPELINE_BUDGET, type=int)
+        )
+        self.pipeline_overflow_input.setCurrentIndex(
+            self.pipeline_overflow_input.findData(
+                self.settings.value(arcane.SETTINGS_KEY_PIPELINE_OVERFLOW, arcane.OverflowPolicy.Block)
+            )
+        )
+        self.chunk_cache_size_input.setValue(
+            self.settings.value(arcane.SETTINGS_KEY_CHUNK_CACHE_SIZE, arcane.VD_CHUNK_CACHE_SIZE, type=int)
+        )
+
     def save_settings(self) -> None:
         """ Save remote desktop settings to the settings """
         # Save Options
@@ -120,6 +223,124 @@ class RemoteDesktopOptionsTab(QWidget):
         self.settings.setValue(arcane.SETTINGS_KEY_PACKET_SIZE, self.packet_size_input.currentData())
         self.settings.setValue(arcane.SETTINGS_KEY_BLOCK_SIZE, self.block_size_input.currentData())
 
+        # Save Input Options
+        self.settings.setValue(arcane.SETTINGS_KEY_MOUSE_MOVE_RATE, self.mouse_move_rate_input.value())
+
+        # Save Rendering Options
+        self.settings.setValue(arcane.SETTINGS_KEY_DECODE_DOWNSCALE, self.decode_downscale_checkbox.isChecked())
+        self.settings.setValue(arcane.SETTINGS_KEY_DIRECT_BLIT, self.direct_blit_checkbox.isChecked())
+        self.settings.setValue(arcane.SETTINGS_KEY_ENGINE_PROCESS, self.engine_process_checkbox.isChecked())
+        self.settings.setValue(arcane.SETTINGS_KEY_PIPELINE_BUDGET, self.pipeline_budget_input.value())
+        self.settings.setValue(arcane.SETTINGS_KEY_PIPELINE_OVERFLOW, self.pipeline_overflow_input.currentData())
+        self.settings.setValue(arcane.SETTINGS_KEY_CHUNK_CACHE_SIZE, self.chunk_cache_size_input.value())
+
+
+class TransportProfileGroup(QGroupBox):
+    """ Transport profile (socket options) of a channel, options not displayed (E.g. keepalive probes) are kept as
+    loaded """
+    def __init__(self, title: str) -> None:
+        super().__init__(title)
+
+        self.profile = arcane.TransportProfile()
+
+        layout = QGridLayout()
+        self.setLayout(layout)
+
+        layout.setContentsMargins(8, 16, 8, 8)
+
+        # Small writes are sent right away instead of being grouped (Nagle's algorithm)
+        self.no_delay_checkbox = QCheckBox("Send small packets immediately (TCP_NODELAY)")
+
+        layout.addWidget(self.no_delay_checkbox, 0, 0, 1, 2)
+
+        receive_buffer_size_label = QLabel("Receive Buffer:")
+
+        self.receive_buffer_size_input = QSpinBox()
+        self.receive_buffer_size_input.setMinimum(0)
+        self.receive_buffer_size_input.setMaximum(65536)
+        self.receive_buffer_size_input.setSuffix(" KiB")
+        self.receive_buffer_size_input.setSpecialValueText("System Default")
+
+        send_buffer_size_label = QLabel("Send Buffer:")
+
+        self.send_buffer_size_input = QSpinBox()
+        self.send_buffer_size_input.setMinimum(0)
+        self.send_buffer_size_input.setMaximum(65536)
+        self.send_buffer_size_input.setSuffix(" KiB")
+        self.send_buffer_size_input.setSpecialValueText("System Default")
+
+        # Idle time before keepalive probes are sent
+        keepalive_idle_label = QLabel("Keepalive:")
+
+        self.keepalive_idle_input = QSpinBox()
+        self.keepalive_idle_input.setMinimum(0)
+        self.keepalive_idle_input.setMaximum(7200)
+        self.keepalive_idle_input.setSuffix(" s")
+        self.keepalive_idle_input.setSpecialValueText("Disabled")
+
+        layout.addWidget(receive_buffer_size_label, 1, 0)
+        layout.addWidget(self.receive_buffer_size_input, 1, 1)
+
+        layout.addWidget(send_buffer_size_label, 2, 0)
+        layout.addWidget(self.send_buffer_size_input, 2, 1)
+
+        layout.addWidget(keepalive_idle_label, 3, 0)
+        layout.addWidget(self.keepalive_idle_input, 3, 1)
+
+    def load_profile(self, profile: arcane.TransportProfile) -> None:
+        self.profile = profile
+
+        self.no_delay_checkbox.setChecked(profile.no_delay)
+        self.receive_buffer_size_input.setValue(profile.receive_buffer_size // 1024)
+        self.send_buffer_size_input.setValue(profile.send_buffer_size // 1024)
+        self.keepalive_idle_input.setValue(profile.keepalive_idle)
+
+    def edited_profile(self) -> arcane.TransportProfile:
+        return self.profile.updated({
+            "no_delay": self.no_delay_checkbox.isChecked(),
+            "receive_buffer_size": self.receive_buffer_size_input.value() * 1024,
+            "send_buffer_size": self.send_buffer_size_input.value() * 1024,
+            "keepalive_idle": self.keepalive_idle_input.value(),
+        })
+
+
+class NetworkOptionsTab(QWidget):
+    """ Network Options Tab """
+    def __init__(self, options_dialog: QDialog, settings: QSettings) -> None:
+        super().__init__()
+
+        self.options_dialog = options_dialog
+
+        self.settings = settings
+
+        core_layout = QVBoxLayout()
+        self.setLayout(core_layout)
+
+        # Transport profile of each channel (Fieldsets)
+        self.transport_profile_groups: Dict[arcane.WorkerKind, TransportProfileGroup] = {}
+        for worker_kind in arcane.WorkerKind:
+            transport_profile_group = TransportProfileGroup(f"{worker_kind.name} Channel")
+            core_layout.addWidget(transport_profile_group)
+
+            self.transport_profile_groups[worker_kind] = transport_profile_group
+
+        core_layout.addItem(QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding))
+
+    def load_settings(self) -> None:
+        """ Load network settings from the settings """
+        transport_profiles = arcane.load_transport_profiles(self.settings)
+
+        for worker_kind, transport_profile_group in self.transport_profile_groups.items():
+            transport_profile_group.load_profile(transport_profiles[worker_kind])
+
+    def save_settings(self) -> None:
+        """ Save network settings to the settings """
+        for worker_kind, transport_profile_group in self.transport_profile_groups.items():
+            self.settings.setValue(
+                f"{arcane.SETTINGS_KEY_TRANSPORT_PROFILE}.{worker_kind.name}",
+                transport_profile_group.edited_profile().as_dict(),
+            )
+
 
 class TrustedCertificateModel(QStandardItemModel):
     """ Trusted Certificate Model (Disables editing of the fingerprint) """
@@ -344,6 +565,10 @@ class OptionsDialog(utilities.QCenteredDialog):
         self.remote_desktop_tab = RemoteDesktopOptionsTab(self, self.settings)
         self.options_tab_widget.addTab(self.remote_desktop_tab, "Remote Desktop")
 
+        # Network Tab
+        self.network_tab = NetworkOptionsTab(self, self.settings)
+        self.options_tab_widget.addTab(self.network_tab, "Network")
+
         # Trusted Certificates Tab
         self.trusted_certificates_tab = TrustedCertificatesOptionsTab(self, self.settings)
         self.options_tab_widget.addTab(self.trusted_certificates_tab, "Trusted Certificates")
@@ -375,10 +600,12 @@ class OptionsDialog(utilities.QCenteredDialog):
 
     def load_settings(self) -> None:
         self.remote_desktop_tab.load_settings()
+        self.network_tab.load_settings()
         self.trusted_certificates_tab.load_settings()
 
     def save_settings(self) -> None:
         self.remote_desktop_tab.save_settings()
+        self.network_tab.save_settings()
         self.trusted_certificates_tab.save_settings()
 
         self.accept()
@@ -6,7 +6,6 @@
 
 import json
 import os.path
-import socket
 from typing import Optional
 
 from PyQt6.QtCore import QSettings, QSize, Qt, pyqtSlot
@@ -163,14 +162,10 @@ class ConnectWindow(utilities.QCenteredMainWindow):
     def submit_form(self) -> None:
         """ Validate the form and submit it """
         try:
-            # Check if the ip/hostname is valid
-            hostname = self.server_address_input.text()
-            try:
-                if socket.gethostbyname(hostname) == hostname:
-                    pass
-            except socket.gaierror:
+            # Check server address input, it is resolved by the connect thread (a slow resolver must not freeze the UI)
+            if len(self.server_address_input.text().strip()) == 0:
                 self.server_address_input.setFocus()
-                raise Exception("Invalid hostname or IP address.")
+                raise Exception("Server address field cannot be empty.")
 
             # Check password input
             if len(self.password_input.text().strip()) == 0:
@@ -179,13 +174,14 @@ class ConnectWindow(utilities.QCenteredMainWindow):
 
             # Attempt connection
             self.__connect_thread = arcane_threads.ConnectThread(
-                self.server_address_input.text(),
+                self.server_address_input.text().strip(),
                 self.server_port_input.value(),
                 self.password_input.text(),
             )
 
             self.__connect_thread.thread_started.connect(self.connect_thread_started)
             self.__connect_thread.session_error.connect(self.session_error)
+            self.__connect_thread.connection_phase.connect(self.connection_phase)
             self.__connect_thread.thread_finished.connect(self.connect_thread_finished)
             self.__connect_thread.start()
         except Exception as e:
@@ -207,6 +203,11 @@ class ConnectWindow(utilities.QCenteredMainWindow):
         self.__connecting_dialog = arcane_dialogs.ConnectingDialog(self)
         self.__connecting_dialog.exec()
 
+    @pyqtSlot(str, str, float)
+    def connection_phase(self, connection_name: str, phase: str, duration: float) -> None:
+        if self.__connecting_dialog is not None and self.__connecting_dialog.isVisible():
+            self.__connecting_dialog.add_connection_phase(phase, duration)
+
     @pyqtSlot(object)
     def connect_thread_finished(self, session: Optional[arcane.Session] = None) -> None:
         # Close the connecting form if it is still open
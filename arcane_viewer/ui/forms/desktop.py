@@ -9,15 +9,17 @@
 """
 
 import copy
+import json
 import logging
+import math
 import time
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
-from PyQt6.QtCore import QRect, QRectF, QSize, Qt, pyqtSlot
-from PyQt6.QtGui import (QCloseEvent, QImage, QPainter, QPixmap, QResizeEvent,
-                         QScreen, QShowEvent, QTransform)
-from PyQt6.QtWidgets import (QApplication, QDialog, QGraphicsPixmapItem,
-                             QMainWindow, QMessageBox)
+from PyQt6.QtCore import QRectF, QSize, Qt, QTimer, pyqtSlot
+from PyQt6.QtGui import (QCloseEvent, QKeySequence, QScreen, QShortcut,
+                         QShowEvent)
+from PyQt6.QtWidgets import (QApplication, QDialog, QGraphicsItem, QMainWindow,
+                             QMessageBox)
 
 import arcane_viewer.arcane as arcane
 import arcane_viewer.arcane.threads as arcane_threads
@@ -25,16 +27,35 @@ import arcane_viewer.ui.custom_widgets as arcane_widgets
 import arcane_viewer.ui.dialogs as arcane_dialogs
 
 logger = logging.getLogger(__name__)
+metrics_logger = logging.getLogger("arcane_viewer.metrics")
+
+# Toggle streaming metrics overlay (Not forwarded to the remote desktop)
+METRICS_SHORTCUT = "Ctrl+Alt+F12"
 
 
 class DesktopWindow(QMainWindow):
     def __init__(self, connect_window: Union[QDialog, QMainWindow], session: arcane.Session) -> None:
         super().__init__()
 
-        self.show_fps = False
+        # Received chunks are first composed into the framebuffer (backing image updated in place), then the scene is
+        # refreshed at most once per display refresh (see `flush_scene`)
+        self.desktop_framebuffer: Optional[arcane_widgets.FramebufferItem] = None
+
+        # When the desktop engine process is used, the virtual desktop is painted from its shared framebuffer instead
+        self.shared_framebuffer: Optional[arcane_widgets.SharedFramebufferItem] = None
+        self.damage_tracker = arcane_widgets.DamageTracker()
 
-        self.desktop_graphics_pixmap: Optional[QGraphicsPixmapItem] = None
-        self.desktop_pixmap: Optional[QPixmap] = None
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.flush_timer.timeout.connect(self.flush_scene)
+
+        # When chunks are decoded at display resolution and the window grows, the desktop worker is attached again (once
+        # resizing is over) so that the server sends a complete frame at the new resolution
+        self.resync_timer = QTimer(self)
+        self.resync_timer.setSingleShot(True)
+        self.resync_timer.setInterval(arcane.VD_RESYNC_DELAY)
+        self.resync_timer.timeout.connect(self.resync_desktop)
 
         self.desktop_thread: Optional[arcane_threads.VirtualDesktopThread] = None
         self.events_thread: Optional[arcane_threads.EventsThread] = None
@@ -45,6 +66,8 @@ class DesktopWindow(QMainWindow):
         # will prevent icon to disappear on Windows taskbar when a parent is set to a Window but parent is hidden.
         self.connect_window = connect_window
 
+        self.screen_changed_connected = False
+
         # Set Window Properties, Layout, Title, Icon and Size
         self.window_title = "🖥 {} ({}) :: {} {}".format(
             arcane.APP_DISPLAY_NAME,
@@ -62,20 +85,132 @@ class DesktopWindow(QMainWindow):
         self.tangent_universe = arcane_widgets.TangentUniverse()
         self.setCentralWidget(self.tangent_universe)
 
-        # FPS Counter (Debugging)
-        if self.show_fps:
-            self.FPS_counter = 0
-            self.FPS_Elapsed = time.time()
+        self.tangent_universe.geometry_changed.connect(self.update_render_scale)
+
+        # Streaming Metrics (Toggled at runtime, displayed as an overlay and logged as structured lines)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.report_metrics)
+
+        self.last_events_sent = 0
+
+        self.metrics_shortcut = QShortcut(QKeySequence(METRICS_SHORTCUT), self)
+        self.metrics_shortcut.setContext(Qt.ShortcutContext.WindowShortcut)
+        self.metrics_shortcut.activated.connect(self.toggle_metrics)
 
         self.start_desktop_thread()
 
-    def update_fps(self):
-        self.FPS_counter += 1
-        elapsed = time.time() - self.FPS_Elapsed
-        if elapsed >= 1.0:
-            self.setWindowTitle(f"{self.window_title} - FPS: {self.FPS_counter}")
-            self.FPS_counter = 0
-            self.FPS_Elapsed = time.time()
+    def toggle_metrics(self) -> None:
+        """ Show or hide streaming metrics (overlay and log lines) """
+        if self.metrics_timer.isActive():
+            self.metrics_timer.stop()
+
+            self.tangent_universe.set_overlay(None)
+        else:
+            # Discard counters accumulated while metrics were hidden
+            self.session.metrics.snapshot()
+            if self.events_thread is not None:
+                self.last_events_sent = self.events_thread.events_sent
+
+            self.metrics_timer.start()
+
+    def collect_metrics(self) -> Dict[str, Union[int, float]]:
+        """ Gather streaming metrics of every stage: socket, decode, paint and input """
+        metrics = self.session.metrics.snapshot()
+
+        if self.session.chunk_cache is not None:
+            metrics.update(self.session.chunk_cache.stats())
+
+        if self.desktop_thread is not None:
+            metrics.update(self.desktop_thread.image_pool.stats())
+
+        # Socket, decode and draw stages run in the desktop engine process
+        if isinstance(self.desktop_thread, arcane_threads.EngineDesktopThread):
+            metrics.update({
+                key: value for key, value in self.desktop_thread.engine_metrics.items() if key != "flushes_per_sec"
+            })
+
+        # Queue depths between stages
+        decoder = self.desktop_thread.decoder if self.desktop_thread is not None else None
+        metrics["decode_in_flight"] = decoder.in_flight if decoder is not None else 0
+        metrics["dispatch_queue"] = decoder.pending if decoder is not None else 0
+        metrics["paint_queue"] = self.desktop_thread.chunk_queue.depth if self.desktop_thread is not None else 0
+
+        # Memory held by chunks between stages
+        if self.desktop_thread is not None:
+            metrics["pipeline_bytes"] = self.desktop_thread.budget.held
+            metrics["pipeline_peak_bytes"] = self.desktop_thread.budget.peak
+            metrics["pipeline_budget_bytes"] = self.desktop_thread.budget.budget
+            metrics["pipeline_waits"] = self.desktop_thread.budget.waits
+            metrics["paint_queue_bytes"] = self.desktop_thread.chunk_queue.bytes
+            metrics["paint_dropped"] = self.desktop_thread.chunk_queue.dropped
+
+        # Input
+        if self.events_thread is not None:
+            outbound_stats = self.events_thread.outbound_stats()
+
+            interval = self.metrics_timer.interval() / 1000
+            metrics["input_events_per_sec"] = round(
+                (outbound_stats["events_sent"] - self.last_events_sent) / interval, 1
+            )
+            metrics["input_queue"] = outbound_stats["queue_depth"]
+            metrics["input_dropped"] = outbound_stats["events_dropped"]
+
+            self.last_events_sent = outbound_stats["events_sent"]
+
+        return metrics
+
+    def report_metrics(self) -> None:
+        metrics = self.collect_metrics()
+
+        metrics_logger.info(json.dumps(metrics))
+
+        self.tangent_universe.set_overlay([
+            "Chunks: {} rcv/s, {} dec/s, {} paint/s, {} superseded/s".format(
+                metrics["chunks_received_per_sec"],
+                metrics["chunks_decoded_per_sec"],
+                metrics["chunks_composited_per_sec"],
+                metrics["chunks_superseded_per_sec"],
+            ),
+            "Network: {:.1f} KiB/s".format(metrics["bytes_received_per_sec"] / 1024),
+            "Decode: {} ms avg, {} ms p95, {} converted/s".format(
+                metrics["decode_avg_ms"],
+                metrics["decode_p95_ms"],
+                metrics["format_mismatches_per_sec"],
+            ),
+            "Cache: {:.0%} hits, {} entries, {:.1f} MiB".format(
+                metrics.get("chunk_cache_hit_ratio", 0),
+                metrics.get("chunk_cache_entries", 0),
+                metrics.get("chunk_cache_bytes", 0) / 1048576,
+            ),
+            "Image Pool: {:.0%} reused, {} images, {:.1f} MiB".format(
+                metrics.get("image_pool_reuse_ratio", 0),
+                metrics.get("image_pool_images", 0),
+                metrics.get("image_pool_bytes", 0) / 1048576,
+            ),
+            "Composite: {} ms avg, {} ms p95 ({} flush/s)".format(
+                metrics["composite_avg_ms"],
+                metrics["composite_p95_ms"],
+                metrics["flushes_per_sec"],
+            ),
+            "Queues: {} decoding, {} dispatch, {} paint".format(
+                metrics["decode_in_flight"],
+                metrics["dispatch_queue"],
+                metrics["paint_queue"],
+            ),
+            "Pipeline: {:.1f} / {:.0f} MiB ({:.1f} MiB peak), {} waits, {} dropped".format(
+                metrics.get("pipeline_bytes", 0) / 1048576,
+                metrics.get("pipeline_budget_bytes", 0) / 1048576,
+                metrics.get("pipeline_peak_bytes", 0) / 1048576,
+                metrics.get("pipeline_waits", 0),
+                metrics.get("paint_dropped", 0),
+            ),
+            "Input: {} events/s, {} queued, {} dropped".format(
+                metrics.get("input_events_per_sec", 0),
+                metrics.get("input_queue", 0),
+                metrics.get("input_dropped", 0),
+            ),
+        ])
 
     def thread_finished(self, on_error: bool) -> None:
         """ Handle the thread finished event """
@@ -84,13 +219,22 @@ class DesktopWindow(QMainWindow):
 
         self.close()
 
-    def start_desktop_thread(self) -> None:
+    def start_desktop_thread(self, preferred_screen_name: Optional[str] = None) -> None:
         """ Desktop thread is responsible for rendering the remote desktop in the virtual desktop window
             (Tangent Universe) """
         self.stop_desktop_thread()
 
-        self.desktop_thread = arcane_threads.VirtualDesktopThread(self.session)
-        self.desktop_thread.received_dirty_rect_signal.connect(self.update_scene)
+        desktop_thread_class = arcane_threads.VirtualDesktopThread
+        if self.session.option_engine_process:
+            desktop_thread_class = arcane_threads.EngineDesktopThread
+
+        self.desktop_thread = desktop_thread_class(
+            self.session,
+            preferred_screen_name,
+            self.desktop_framebuffer.store_scale if self.desktop_framebuffer is not None else 1.0,
+        )
+        self.desktop_thread.chunks_queued_signal.connect(self.schedule_flush)
+        self.desktop_thread.regions_dirty_signal.connect(self.schedule_flush)
         self.desktop_thread.open_cellar_door.connect(self.open_cellar_door)
         self.desktop_thread.thread_finished.connect(self.thread_finished)
         self.desktop_thread.request_screen_selection_dialog_signal.connect(self.display_screen_selection_dialog)
@@ -101,10 +245,16 @@ class DesktopWindow(QMainWindow):
         if self.desktop_thread is None:
             return
 
+        # Window must not be closed because we stopped the thread ourselves
+        self.desktop_thread.thread_finished.disconnect(self.thread_finished)
+
         if self.desktop_thread.isRunning():
             self.desktop_thread.stop()
             self.desktop_thread.wait()
 
+        # Chunks still queued are owned by the thread, paint them before it goes away
+        self.flush_scene()
+
         self.desktop_thread = None
 
     def start_events_thread(self) -> None:
@@ -118,6 +268,10 @@ class DesktopWindow(QMainWindow):
         if self.session is None or self.session.presentation:
             return
 
+        # Desktop worker was attached again (resync), events worker is still alive
+        if self.events_thread is not None and self.events_thread.isRunning():
+            return
+
         self.stop_events_thread()
 
         self.events_thread = arcane_threads.EventsThread(self.session)
@@ -149,13 +303,27 @@ class DesktopWindow(QMainWindow):
         if self.connect_window is not None:
             self.connect_window.hide()
 
+        # Moving the window to another screen might change the device pixel ratio
+        window_handle = self.windowHandle()
+        if window_handle is not None and not self.screen_changed_connected:
+            window_handle.screenChanged.connect(lambda _: self.invalidate_geometry())
+
+            self.screen_changed_connected = True
+
     def closeEvent(self, event: Optional[QCloseEvent]) -> None:
         """ Overridden close method to handle the cleanup
             `I Hope That When The World Comes To An End, I Can Breathe A Sigh Of Relief Because There Will Be So Much To
              Look Forward To.`"""
 
+        self.resync_timer.stop()
+
         self.close_cellar_door()
 
+        self.session.release_preattached_workers()
+
+        if self.shared_framebuffer is not None:
+            self.shared_framebuffer.release()
+
         if event is not None:
             event.accept()
 
@@ -166,16 +334,79 @@ class DesktopWindow(QMainWindow):
         """ Initialize the virtual desktop (Tangent Universe) """
         screen = copy.deepcopy(screen)  # Create an independent copy of the screen object
 
-        self.tangent_universe.reset_scene()
+        self.damage_tracker.clear()
+
+        if isinstance(self.desktop_thread, arcane_threads.EngineDesktopThread):
+            screen_resized = self.shared_framebuffer is None or self.shared_framebuffer.size() != screen.size()
+
+            if not self.open_shared_framebuffer(self.desktop_thread, screen):
+                return
+        else:
+            screen_resized = self.desktop_framebuffer is None or self.desktop_framebuffer.size != screen.size()
 
-        self.desktop_pixmap = QPixmap(screen.size())
-        self.desktop_pixmap.fill(Qt.GlobalColor.black)
+            self.open_framebuffer(screen)
 
-        self.desktop_graphics_pixmap = QGraphicsPixmapItem(self.desktop_pixmap)
+        # Window was already sized for this remote screen (E.g. desktop worker attached again), keep it as the user left
+        # it. Otherwise it is sized before the view is fitted, so the render scale is computed for the final window size
+        # instead of the initial one
+        if screen_resized:
+            self.adjust_window_geometry(screen)
 
-        self.tangent_universe.desktop_scene.addItem(self.desktop_graphics_pixmap)
         self.tangent_universe.set_screen(screen)
 
+        # Streaming starts once the virtual desktop is ready, at its render scale (the desktop engine process does not
+        # wait for it, it draws into its own framebuffer)
+        if (self.desktop_framebuffer is None or self.desktop_thread is None or
+                isinstance(self.desktop_thread, arcane_threads.EngineDesktopThread)):
+            return
+
+        if self.session.option_direct_blit:
+            self.desktop_thread.set_blit_target(self.desktop_framebuffer.blit)
+
+        self.desktop_thread.cellar_door_ready.set()
+
+    def open_framebuffer(self, screen: arcane.Screen) -> None:
+        """ Create or resize the framebuffer chunks are composed into """
+        # If the remote screen changed, the framebuffer is resized instead of being recreated, tiles which are still
+        # within the new bounds remain cached.
+        if self.desktop_framebuffer is None:
+            self.tangent_universe.reset_scene()
+
+            self.desktop_framebuffer = arcane_widgets.FramebufferItem(screen.size())
+
+            self.tangent_universe.desktop_scene.addItem(self.desktop_framebuffer)
+        else:
+            self.desktop_framebuffer.resize(screen.size())
+
+    def open_shared_framebuffer(self, engine_thread: arcane_threads.EngineDesktopThread,
+                                screen: arcane.Screen) -> bool:
+        """ Map the framebuffer shared by the desktop engine process """
+        if engine_thread.shared_memory_name is None:
+            return False
+
+        try:
+            framebuffer = arcane.SharedFramebuffer(
+                screen.size(),
+                engine_thread.region_locks,
+                engine_thread.shared_memory_name
+            )
+        except FileNotFoundError:
+            # Already replaced by the engine (screen updated again), a newer notification is on its way
+            return False
+
+        if self.shared_framebuffer is None:
+            self.tangent_universe.reset_scene()
+
+            self.shared_framebuffer = arcane_widgets.SharedFramebufferItem(framebuffer)
+
+            self.tangent_universe.desktop_scene.addItem(self.shared_framebuffer)
+        else:
+            self.shared_framebuffer.set_framebuffer(framebuffer)
+
+        return True
+
+    def adjust_window_geometry(self, screen: arcane.Screen) -> None:
+        """ Size and center the virtual desktop window regarding the remote screen and our current monitor """
         # Initialize the size of virtual desktop window regarding our current monitor screen size
         local_screen: Optional[QScreen] = None
 
@@ -223,65 +454,99 @@ class DesktopWindow(QMainWindow):
             new_height
         )
 
-    def fit_scene(self) -> None:
-        """ Fit the scene (Hacky Technique) to the view """
-        if (
-                self.tangent_universe is None or
-                self.desktop_graphics_pixmap is None or
-                self.desktop_pixmap is None
-        ):
+    def invalidate_geometry(self) -> None:
+        """ Recompute how the virtual desktop is scaled into the window, must be called when something affecting the
+        geometry changes outside of a resize (E.g. window moved to a screen with a different pixel ratio) """
+        self.tangent_universe.invalidate_geometry()
+
+    def update_render_scale(self) -> None:
+        """ When enabled, keep the virtual desktop at display resolution: chunks are decoded at the scale they are
+        displayed at instead of being decoded at full resolution then scaled down on each paint """
+        if not self.session.option_decode_downscale or self.desktop_framebuffer is None:
             return
 
-        # Instead of bellow code:
-        #   `self.view.fitInView(self.desktop_graphics_pixmap, Qt.AspectRatioMode.IgnoreAspectRatio)`
-        # We will calculate the scale factor manually to avoid the aspect ratio issue and fitting correctly the view to
-        # our virtual desktop host window.
-        view_rect = self.tangent_universe.frameRect()
+        # Scale is rounded up to a few steps, so a resize only affects the pipeline when crossing a step
+        scale = min(
+            1.0,
+            math.ceil(self.tangent_universe.display_scale() * arcane.VD_DOWNSCALE_STEPS) / arcane.VD_DOWNSCALE_STEPS
+        )
+        if scale == self.desktop_framebuffer.store_scale:
+            return
 
-        scale_x = view_rect.width() / self.desktop_pixmap.width()
-        scale_y = view_rect.height() / self.desktop_pixmap.height()
+        grown = scale > self.desktop_framebuffer.store_scale
 
-        transform = QTransform()
-        transform.scale(scale_x, scale_y)
-        self.tangent_universe.setTransform(transform, False)
+        logger.debug(f"Virtual desktop render scale: {self.desktop_framebuffer.store_scale} -> {scale}")
 
-        self.tangent_universe.setSceneRect(
-            0,
-            0,
-            self.desktop_pixmap.width(),
-            self.desktop_pixmap.height(),
-        )
+        self.desktop_framebuffer.set_scale(scale)
+        self.desktop_framebuffer.update()
 
-    def update_scene(self, chunk: QImage, x: int, y: int) -> None:
-        """ Update the virtual desktop with the received chunk """
-        if self.desktop_pixmap is None or self.desktop_graphics_pixmap is None:
+        if self.desktop_thread is not None:
+            self.desktop_thread.set_render_scale(scale)
+
+        # Content kept at a lower scale is now blurry, a complete frame is required at the new resolution (nothing to do
+        # if nothing was drawn below the new scale, E.g. window resized before the first frame)
+        content_scale = self.desktop_framebuffer.content_scale
+        if grown and content_scale is not None and content_scale < scale:
+            self.resync_timer.start()
+
+    def resync_desktop(self) -> None:
+        """ Attach the desktop worker again to receive a complete frame at current render scale """
+        if self.desktop_thread is None or self.desktop_thread.selected_screen is None:
             return
 
-        if chunk is None or not isinstance(chunk, QImage):
+        logger.info("Resynchronizing virtual desktop at new render scale...")
+
+        self.start_desktop_thread(self.desktop_thread.selected_screen.name)
+
+        # A complete frame at the current render scale is on its way
+        if self.desktop_framebuffer is not None:
+            self.desktop_framebuffer.reset_content_scale()
+
+    def schedule_flush(self) -> None:
+        """ Refresh the scene on next display refresh (if not already planned) """
+        if not self.flush_timer.isActive():
+            refresh_rate = 60.0
+            local_screen = self.screen()
+            if local_screen is not None and local_screen.refreshRate() > 0:
+                refresh_rate = local_screen.refreshRate()
+
+            self.flush_timer.start(max(1, int(1000 / refresh_rate)))
+
+    def flush_scene(self) -> None:
+        """ Compose every pending chunk into the virtual desktop then refresh the scene once (Tangent Universe) """
+        framebuffer_item: Optional[QGraphicsItem] = self.desktop_framebuffer
+        if framebuffer_item is None:
+            framebuffer_item = self.shared_framebuffer
+
+        if framebuffer_item is None or self.desktop_thread is None:
             return
 
-        # Update the virtual desktop with the received chunk (Tangent Universe)
-        dirty_rect = QRect(x, y, chunk.width(), chunk.height())
+        start = time.perf_counter()
+
+        pending_chunks = self.desktop_thread.take_chunks()
+        chunks = len(pending_chunks)
 
-        painter = QPainter(self.desktop_pixmap)
-        painter.setClipRect(dirty_rect)
-        painter.drawImage(dirty_rect, chunk)
-        painter.end()
+        if chunks and self.desktop_framebuffer is not None:
+            for dirty_rect in self.desktop_framebuffer.compose(pending_chunks):
+                self.damage_tracker.add(dirty_rect)
 
-        # Update the scene with the updated virtual desktop
-        self.desktop_graphics_pixmap.setPixmap(self.desktop_pixmap)
-        self.desktop_graphics_pixmap.update(QRectF(dirty_rect))
+            self.desktop_thread.recycle_chunks(pending_chunks)
 
-        self.fit_scene()
+        # Regions already drawn by the decoder (direct blitting) or the desktop engine process
+        for dirty_region in self.desktop_thread.take_dirty_regions():
+            self.damage_tracker.add(dirty_region)
 
-        # FPS Counter (Debugging)
-        if self.show_fps:
-            self.update_fps()
+        if self.damage_tracker.is_empty():
+            return
+
+        # Only damaged parts of the framebuffer will be repainted
+        for damaged_rect in self.damage_tracker.take():
+            framebuffer_item.update(QRectF(damaged_rect))
 
-    def resizeEvent(self, event: Optional[QResizeEvent]) -> None:
-        """ Overridden resizeEvent method to fit the scene to the view """
-        self.fit_scene()
-        super().resizeEvent(event)
+        if chunks:
+            self.session.metrics.add_composited(time.perf_counter() - start, chunks)
+        else:
+            self.session.metrics.add_flush()
 
     def screen_selection_rejected(self) -> None:
         self.close()